@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""bench_import
+Measure the import time of the scripts with 'python -X importtime' and
+fail when it exceeds a budget, or when a module which must be imported
+lazily is imported at startup
+"""
+
+import argparse
+from pathlib import Path
+import subprocess
+import sys
+
+SCRIPTS_DIR = Path(__file__).parent.parent / Path("dicomjson")
+DEFAULT_MODULES = ["dicom2json", "json2dicom"]
+# Modules only imported by the code paths which need them
+DEFAULT_LAZY_MODULES = ["cv2", "yaml"]
+DEFAULT_BUDGET_MS = 350
+
+
+def import_times(module, repeat):
+    """import_times
+    Import a module in new interpreters and keep the fastest run
+
+    Arguments:
+        module {str} -- Module imported from the scripts directory
+        repeat {int} -- Number of runs
+
+    Returns:
+        list -- (depth, name, cumulative microseconds) of each import of
+            the fastest run, in the order of the importtime report
+    """
+    best = None
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import {}".format(module)],
+            cwd=str(SCRIPTS_DIR), capture_output=True, text=True, check=True)
+        imports = []
+        for line in completed.stderr.splitlines():
+            if not line.startswith("import time:") or line.endswith("imported package"):
+                continue
+            _, cumulative, name = line.split("|")
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            imports.append((depth, name.strip(), int(cumulative)))
+        if best is None or imports[-1][2] < best[-1][2]:
+            best = imports
+    return best
+
+
+def main():
+    """main
+    Print the import time of each module and its heaviest imports
+
+    Returns:
+        int -- 1 when a module exceeds the budget or imports a lazy module
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "modules",
+        nargs='*',
+        type=str,
+        help="modules of the 'dicomjson' folder to import (default: {})".format(
+            " ".join(DEFAULT_MODULES)),
+        default=DEFAULT_MODULES)
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        help="number of runs for each module, the fastest one is kept",
+        default=5)
+    parser.add_argument(
+        "-b",
+        "--budget",
+        type=float,
+        help="maximum import time of each module, in milliseconds (default: {})".format(
+            DEFAULT_BUDGET_MS),
+        default=DEFAULT_BUDGET_MS)
+    parser.add_argument(
+        "-l",
+        "--lazy",
+        nargs='*',
+        type=str,
+        help="modules which must not be imported at startup (default: {})".format(
+            " ".join(DEFAULT_LAZY_MODULES)),
+        default=DEFAULT_LAZY_MODULES)
+    parser.add_argument(
+        "-t",
+        "--top",
+        type=int,
+        help="number of heaviest imports printed for each module",
+        default=5)
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules:
+        imports = import_times(module, args.repeat)
+        total_ms = imports[-1][2] / 1000
+        print("{:<12} {:>8.1f} ms".format(module, total_ms))
+        direct_imports = sorted((imported for imported in imports if imported[0] == 1),
+                                key=lambda imported: imported[2], reverse=True)
+        for _, name, cumulative in direct_imports[:args.top]:
+            print("  {:<30} {:>8.1f} ms".format(name, cumulative / 1000))
+
+        if total_ms > args.budget:
+            failures.append("{} import takes {:.1f} ms, budget is {:.1f} ms".format(
+                module, total_ms, args.budget))
+        imported_names = {name for _, name, _ in imports}
+        for lazy_module in args.lazy:
+            if lazy_module in imported_names:
+                failures.append("{} imports '{}' at startup".format(module, lazy_module))
+
+    for failure in failures:
+        print("FAIL: {}".format(failure))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    exit(main())
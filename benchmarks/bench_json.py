@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""bench_json
+Compare the throughput of JSON backends and styles on template files
+written by dicom2json.py
+"""
+
+import argparse
+from pathlib import Path
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).parent.parent / Path("dicomjson")))
+
+from constants import JsonStyle  # noqa: E402
+from json_backend import available_json_backends, get_json_backend  # noqa: E402
+
+
+def measure(function, data, repeat):
+    """measure
+    Run a function several times and keep the best duration
+
+    Arguments:
+        function {callable} -- Function to measure
+        data {object} -- Function argument
+        repeat {int} -- Number of runs
+
+    Returns:
+        float -- Best duration in seconds
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(data)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def main():
+    """main
+    Print dumps/loads throughput for each available backend and style
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "templates",
+        nargs='+',
+        type=str,
+        help="template JSON files written by dicom2json.py")
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        help="number of runs for each measure",
+        default=5)
+    args = parser.parse_args()
+
+    reference_backend = get_json_backend("json")
+    templates = [reference_backend.loads(Path(template).read_bytes())
+                 for template in args.templates]
+
+    print("{:<8} {:<8} {:>12} {:>14} {:>14}".format(
+        "backend", "style", "size (MB)", "dumps (MB/s)", "loads (MB/s)"))
+    for backend_name in available_json_backends():
+        json_backend = get_json_backend(backend_name)
+        for json_style in JsonStyle:
+            encoded = [json_backend.dumps(template, json_style)
+                       for template in templates]
+            size = sum(len(data) for data in encoded) / 1e6
+            dumps_duration = measure(
+                lambda data: [json_backend.dumps(template, json_style) for template in data],
+                templates, args.repeat)
+            loads_duration = measure(
+                lambda data: [json_backend.loads(template) for template in data],
+                encoded, args.repeat)
+            print("{:<8} {:<8} {:>12.2f} {:>14.1f} {:>14.1f}".format(
+                backend_name, json_style.value, size,
+                size / dumps_duration, size / loads_duration))
+
+
+if __name__ == "__main__":
+    main()
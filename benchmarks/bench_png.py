@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""bench_png
+Compare PNG encoding throughput and output size for each compression
+level and preset, on 8 bits and 16 bits images
+"""
+
+import argparse
+from pathlib import Path
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / Path("dicomjson")))
+
+from image_io import PNG_PRESETS, PngOptions, read_image  # noqa: E402
+
+
+def synthetic_images(size):
+    """synthetic_images
+    Create smooth noisy 8 bits and 16 bits images, close to medical images
+
+    Arguments:
+        size {int} -- Number of rows and columns
+
+    Returns:
+        dict -- Images indexed by name
+    """
+    rows, columns = np.mgrid[0:size, 0:size]
+    noise = np.random.default_rng(0).normal(0, 20, (size, size))
+    image = (np.sin(columns / 50) + np.cos(rows / 70) + 2) * 1000 + noise
+    image_16 = np.clip(image, 0, 4095).astype(np.uint16)
+    return {
+        "synthetic 8 bits": (image_16 >> 4).astype(np.uint8),
+        "synthetic 16 bits": image_16,
+    }
+
+
+def measure(image, params, repeat):
+    """measure
+    Encode an image several times and keep the best duration
+
+    Arguments:
+        image {np.ndarray} -- Image to encode
+        params {list} -- cv2.imencode parameters
+        repeat {int} -- Number of runs
+
+    Returns:
+        tuple -- Best duration in seconds and encoded size in bytes
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _, encoded = cv2.imencode(".png", image, params)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best, len(encoded)
+
+
+def main():
+    """main
+    Print PNG encoding throughput and size for each level and preset
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "images",
+        nargs='*',
+        type=str,
+        help="images written by dicom2json.py, synthetic images are used when empty")
+    parser.add_argument(
+        "-s",
+        "--size",
+        type=int,
+        help="number of rows and columns of synthetic images",
+        default=1024)
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        help="number of runs for each measure",
+        default=5)
+    args = parser.parse_args()
+
+    if args.images:
+        images = {image: read_image(image) for image in args.images}
+    else:
+        images = synthetic_images(args.size)
+
+    settings = [(name, png_options) for name, png_options in PNG_PRESETS.items()]
+    settings += [("level {}".format(level), PngOptions(level))
+                 for level in range(10)]
+
+    print("{:<24} {:<10} {:>14} {:>10} {:>8}".format(
+        "image", "settings", "encode (MB/s)", "size (KB)", "ratio"))
+    for image_name, image in images.items():
+        # Multi-frame images are measured on their first frame
+        if image.ndim == 3:
+            image = image[0]
+        image = np.ascontiguousarray(image)
+        for settings_name, png_options in settings:
+            duration, size = measure(
+                image, png_options.imwrite_params(), args.repeat)
+            print("{:<24} {:<10} {:>14.1f} {:>10.1f} {:>8.2f}".format(
+                image_name[-24:], settings_name, image.nbytes / duration / 1e6,
+                size / 1e3, image.nbytes / size))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,23 +5,97 @@ Contains constants for scripts
 from enum import Enum
 
 
+class BulkDataConstants(Enum):
+    """BulkDataConstants
+    Constants associated to bulk data sidecar files
+    """
+    SUFFIX = ".bin"
+
+
 class DicomConstants(Enum):
     """DicomConstants
     Constants associated to DICOM data
     """
+    MAGIC = b"DICM"
+    PREAMBLE_LENGTH = 128
     SUFFIX = ".dcm"
+    # Suffix of files written before being renamed, after the process id
+    TEMPORARY_SUFFIX = ".part"
+
+
+class GeneratorType(Enum):
+    """GeneratorType
+    Value generators of a json2dicom 'generate' specification
+    """
+    CHOICE = "choice"
+    DATE = "date"
+    RANGE = "range"
+    SEQUENCE = "sequence"
+    UID = "uid"
+
+
+class ImageFormat(Enum):
+    """ImageFormat
+    Formats available for images extracted from PixelData
+    """
+    NPY = "npy"
+    PNG = "png"
+    RAW = "raw"
 
 
 class JsonConstants(Enum):
     """JsonConstants
     Constants associated to JSON data
     """
+    BYTES_IN = "bytes_in"
+    BYTES_OUT = "bytes_out"
+    COUNT = "count"
     DATA = "data"
+    FIELDS = "fields"
+    GENERATE = "generate"
     IMAGE = "image"
+    INDEX = "index"
     META = "meta"
+    MTIME = "mtime"
     OUTPUT = "output"
+    REASON = "reason"
+    SEED = "seed"
+    SHA256 = "sha256"
+    SIZE = "size"
+    SOURCE = "source"
     SUFFIX = ".json"
     TEMPLATE = "template"
+    TIMINGS = "timings"
+
+
+class JsonLinesConstants(Enum):
+    """JsonLinesConstants
+    Constants associated to JSON Lines data
+    """
+    SUFFIX = ".jsonl"
+
+
+class JsonStyle(Enum):
+    """JsonStyle
+    Layouts available for written JSON files
+    """
+    COMPACT = "compact"
+    PRETTY = "pretty"
+
+
+class ManifestFormat(Enum):
+    """ManifestFormat
+    Formats available for the dicom2json manifest
+    """
+    JSON = "json"
+    JSONL = "jsonl"
+
+
+class NpyConstants(Enum):
+    """NpyConstants
+    Constants associated to NumPy array data
+    """
+    SUFFIX = ".npy"
 
 
 class PngConstants(Enum):
@@ -29,3 +103,47 @@ class PngConstants(Enum):
     Constants associated to PNG data
     """
     SUFFIX = ".png"
+
+
+class PngFilter(Enum):
+    """PngFilter
+    Row filters applied before PNG compression
+    """
+    ALL = "all"
+    AVG = "avg"
+    FAST = "fast"
+    NONE = "none"
+    PAETH = "paeth"
+    SUB = "sub"
+    UP = "up"
+
+
+class PngStrategy(Enum):
+    """PngStrategy
+    zlib strategies available for PNG compression
+    """
+    DEFAULT = "default"
+    FILTERED = "filtered"
+    FIXED = "fixed"
+    HUFFMAN_ONLY = "huffman_only"
+    RLE = "rle"
+
+
+class RawConstants(Enum):
+    """RawConstants
+    Constants associated to raw pixel data
+    """
+    SUFFIX = ".raw"
+
+
+class Stage(Enum):
+    """Stage
+    Conversion stages timed for each file
+    """
+    PARSE = "parse"
+    PIXEL_DECODE = "pixel_decode"
+    PIXEL_ENCODE = "pixel_encode"
+    READ = "read"
+    SERIALIZE = "serialize"
+    VALIDATE = "validate"
+    WRITE = "write"
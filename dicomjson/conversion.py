@@ -0,0 +1,554 @@
+"""conversion
+Convert DICOM datasets to JSON and back in memory, without reading or
+writing files. dicom2json and json2dicom are built on these functions
+"""
+
+from functools import partial
+from io import BytesIO
+import json
+import logging
+import os
+from pathlib import Path
+from urllib.parse import urlparse
+from pydicom import dcmread
+from pydicom.dataset import Dataset, FileDataset
+from pydicom.uid import ExplicitVRLittleEndian
+from constants import DicomConstants, JsonConstants, Stage
+from dicom_dictionary import DicomFieldFilter, resolve_dicom_field
+from image_io import (PIXEL_DATA_TAG, expected_pixel_data_length, frames_view,
+                      is_pixel_data_length_valid, pixel_data_buffer,
+                      read_dataset_without_pixel_data, write_pixel_data)
+from timing import measure
+from validation import is_valid_field, parse_tag, vm_mismatch
+
+# Name given to in-memory data in log messages
+IN_MEMORY_NAME = "<memory>"
+
+logger = logging.getLogger('root')
+
+
+def resolve_dicom_fields(remove_dicom_fields):
+    """resolve_dicom_fields
+    Convert DICOM field names to tag filters, once for the whole batch.
+    Unknown names are reported and ignored
+
+    Arguments:
+        remove_dicom_fields {list} -- DICOM field names, keywords or tags
+
+    Returns:
+        list -- DicomFieldFilter items
+    """
+    dicom_field_filters = []
+    for dicom_fields_name in remove_dicom_fields or []:
+        if isinstance(dicom_fields_name, DicomFieldFilter):
+            dicom_field_filters.append(dicom_fields_name)
+            continue
+        dicom_field_filter = resolve_dicom_field(dicom_fields_name)
+        if dicom_field_filter is None:
+            dicom_error = "Unrecognized DICOM field named '{}'".format(
+                dicom_fields_name)
+            logger.warning(dicom_error)
+        else:
+            dicom_field_filters.append(dicom_field_filter)
+    return dicom_field_filters
+
+
+def matching_dicom_field_tags(dicom_dataset, dicom_field_filters):
+    """matching_dicom_field_tags
+    Find the DICOM fields of the dataset matching the filters, and warn the
+    user about filters matching no field
+
+    Arguments:
+        dicom_dataset {Dataset} -- DICOM dataset
+        dicom_field_filters {list} -- DicomFieldFilter items
+
+    Returns:
+        set -- Tags of the matching fields
+    """
+    matching_tags = set()
+    for dicom_field_filter in dicom_field_filters:
+        if dicom_field_filter.is_repeater:
+            tags = [tag for tag in dicom_dataset.keys()
+                    if dicom_field_filter.matches(tag)]
+        elif dicom_field_filter.value in dicom_dataset:
+            tags = [dicom_field_filter.value]
+        else:
+            tags = []
+
+        if not tags:
+            dicom_error = "Unrecognized DICOM field named '{}'".format(
+                dicom_field_filter.name)
+            logger.warning(dicom_error)
+        matching_tags.update(tags)
+    return matching_tags
+
+
+def remove_dicom_fields_from_dataset(dicom_dataset, dicom_field_filters):
+    """remove_dicom_fields_from_dataset
+    Remove DICOM fields matching the filters from the dataset
+
+    Arguments:
+        dicom_dataset {Dataset} -- DICOM dataset
+        dicom_field_filters {list} -- DicomFieldFilter items
+    """
+    for tag in matching_dicom_field_tags(dicom_dataset, dicom_field_filters):
+        del dicom_dataset[tag]
+
+
+def dataset_without_fields(dicom_dataset, tags):
+    """dataset_without_fields
+    Give a dataset holding the elements of dicom_dataset except the given
+    fields. Elements are shared, not copied, and the given dataset is left
+    unchanged
+
+    Arguments:
+        dicom_dataset {Dataset} -- DICOM dataset
+        tags {set} -- Tags of the fields to leave out
+
+    Returns:
+        Dataset -- Dataset without the fields
+    """
+    # Elements not decoded yet are decoded with the encoding of the file
+    kept_dataset = Dataset({tag: dicom_dataset.get_item(tag) for tag in dicom_dataset.keys()
+                            if tag not in tags})
+    kept_dataset.is_little_endian = dicom_dataset.is_little_endian
+    kept_dataset.is_implicit_VR = dicom_dataset.is_implicit_VR
+    return kept_dataset
+
+
+def read_dicom(source, metadata_only=False):
+    """read_dicom
+    Read a DICOM dataset from bytes, a file-like object or a filepath
+
+    Arguments:
+        source {bytes, file, str, Path or Dataset} -- DICOM data, a dataset
+            is returned as is
+
+    Keyword Arguments:
+        metadata_only {bool} -- Skip the PixelData value, the fields stored
+            after it are still read (default: {False})
+
+    Returns:
+        Dataset -- DICOM dataset
+    """
+    if isinstance(source, Dataset):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = BytesIO(source)
+    elif isinstance(source, (str, os.PathLike)):
+        source = str(source)
+    if not metadata_only:
+        return dcmread(source)
+    if isinstance(source, str):
+        with open(source, "rb") as dicom_file:
+            dicom_dataset, _ = read_dataset_without_pixel_data(dicom_file)
+    else:
+        dicom_dataset, _ = read_dataset_without_pixel_data(source)
+    # Loaded when the file cannot be read past it
+    dicom_dataset.pop(PIXEL_DATA_TAG, None)
+    return dicom_dataset
+
+
+def dataset_to_json(dicom_dataset, remove_dicom_fields=None, bulk_data_threshold=None,
+                    bulk_data_element_handler=None):
+    """dataset_to_json
+    Describe a dataset and its file meta information as a dicom2json
+    template. The fields to remove are left out of the template, the
+    dataset is not modified
+
+    Arguments:
+        dicom_dataset {Dataset} -- DICOM dataset
+
+    Keyword Arguments:
+        remove_dicom_fields {list} -- DICOM field names or DicomFieldFilter
+            items to not describe (default: {None})
+        bulk_data_threshold {int} -- Size of base64 encoded binary values
+            above which bulk_data_element_handler is called (default: {None},
+            every value is inline)
+        bulk_data_element_handler {callable} -- Function returning the
+            BulkDataURI of a data element (default: {None})
+
+    Returns:
+        dict -- Template with 'meta' and 'data' keys
+    """
+    file_meta = getattr(dicom_dataset, "file_meta", None) or Dataset()
+    if remove_dicom_fields:
+        removed_tags = matching_dicom_field_tags(
+            dicom_dataset, resolve_dicom_fields(remove_dicom_fields))
+        if removed_tags:
+            dicom_dataset = dataset_without_fields(dicom_dataset, removed_tags)
+    if bulk_data_threshold is None:
+        data_json = dicom_dataset.to_json_dict()
+    else:
+        data_json = dicom_dataset.to_json_dict(
+            bulk_data_threshold=bulk_data_threshold,
+            bulk_data_element_handler=bulk_data_element_handler)
+    return {
+        JsonConstants.META.value: file_meta.to_json_dict(),
+        JsonConstants.DATA.value: data_json
+    }
+
+
+def dataset_frames(dicom_dataset):
+    """dataset_frames
+    Give the frames of the uncompressed PixelData of a dataset, without
+    copying them
+
+    Arguments:
+        dicom_dataset {Dataset} -- DICOM dataset
+
+    Raises:
+        ValueError: PixelData length is not consistent with the image size
+
+    Returns:
+        np.ndarray -- Array of shape (frames, rows, columns), None without
+            Rows, Columns, BitsStored or PixelData
+    """
+    rows = dicom_dataset.get('Rows')
+    columns = dicom_dataset.get('Columns')
+    pixel_data = dicom_dataset.get('PixelData')
+    bits_stored = dicom_dataset.get('BitsStored')
+    if not (rows and columns and pixel_data and bits_stored):
+        return None
+    bits_allocated = dicom_dataset.get('BitsAllocated') or bits_stored
+    number_of_frames = int(dicom_dataset.get('NumberOfFrames') or 1)
+    if not is_pixel_data_length_valid(len(pixel_data), expected_pixel_data_length(
+            rows, columns, number_of_frames, bits_allocated)):
+        raise ValueError("PixelData buffer size is not consistent")
+    return frames_view(pixel_data, rows, columns, number_of_frames, bits_allocated)
+
+
+def dicom_to_json(source, remove_dicom_fields=None, metadata_only=False):
+    """dicom_to_json
+    Convert DICOM data to a dicom2json template and its pixel array
+
+    Arguments:
+        source {bytes, file, str, Path or Dataset} -- DICOM data, a dataset
+            is not modified
+
+    Keyword Arguments:
+        remove_dicom_fields {list} -- DICOM field names or DicomFieldFilter
+            items to not describe (default: {None})
+        metadata_only {bool} -- Skip the PixelData value and do not extract
+            the pixel array (default: {False})
+
+    Raises:
+        ValueError: PixelData length is not consistent with the image size
+
+    Returns:
+        tuple -- Template with 'meta' and 'data' keys, and array of shape
+            (frames, rows, columns) or None without image
+    """
+    dicom_dataset = read_dicom(source, metadata_only)
+    # Frames are a view into PixelData, even if PixelData is removed
+    frames = None if metadata_only else dataset_frames(dicom_dataset)
+    return dataset_to_json(dicom_dataset, remove_dicom_fields), frames
+
+
+def remove_fields_with_error(input_filepath, data_dict, dicom_fields_with_error):
+    """remove_fields_with_error
+    Remove DICOM fields from data_dict and warn the user about them
+
+    Arguments:
+        input_filepath {str} -- Input JSON file
+        data_dict {dict} -- DICOM fields described as JSON
+        dicom_fields_with_error {list} -- DICOM fields to remove
+    """
+    for dicom_field_with_error in dicom_fields_with_error:
+        dicom_dict = {
+            dicom_field_with_error: data_dict.pop(dicom_field_with_error)}
+        logger.warning("%s cannot add the field '%s', because the value is not standard with the VR: '%s'",
+                       input_filepath, dicom_field_with_error, dicom_dict)
+
+
+def remove_invalid_fields(input_filepath, data_dict):
+    """remove_invalid_fields
+    Remove from data_dict each DICOM field which is not standard with the
+    VR of the DICOM data dictionary. A field whose values count does not
+    match the VM is kept with a warning
+
+    Arguments:
+        input_filepath {str} -- Input JSON file
+        data_dict {dict} -- DICOM fields described as JSON
+    """
+    dicom_fields_with_error = []
+    for dicom_json_tag, dicom_json_value in data_dict.items():
+        if not is_valid_field(dicom_json_tag, dicom_json_value):
+            dicom_fields_with_error.append(dicom_json_tag)
+            continue
+        vm = vm_mismatch(dicom_json_tag, dicom_json_value)
+        if vm is not None:
+            logger.warning("%s field '%s' has %d value(s), its VM is '%s' in the DICOM dictionary",
+                           input_filepath, dicom_json_tag, len(dicom_json_value["Value"]), vm)
+    remove_fields_with_error(input_filepath, data_dict, dicom_fields_with_error)
+
+
+def remove_unparsable_fields(input_filepath, data_dict, bulk_data_dir=None):
+    """remove_unparsable_fields
+    Remove from data_dict each DICOM field which cannot be parsed by pydicom.
+    Each field is parsed alone, so it must only be used when the whole
+    dataset cannot be parsed
+
+    Arguments:
+        input_filepath {str} -- Input JSON file
+        data_dict {dict} -- DICOM fields described as JSON
+
+    Keyword Arguments:
+        bulk_data_dir {Path} -- Directory of relative BulkDataURI
+            (default: {None}, the current directory)
+    """
+    dicom_fields_with_error = []
+    for dicom_json_value in data_dict:
+        try:
+            Dataset().from_json(
+                {dicom_json_value: data_dict.get(dicom_json_value)},
+                partial(read_bulk_data, bulk_data_dir or Path()))
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            dicom_fields_with_error.append(dicom_json_value)
+    remove_fields_with_error(input_filepath, data_dict,
+                             dicom_fields_with_error)
+
+
+def read_bulk_data(bulk_data_dir, bulk_data_uri):
+    """read_bulk_data
+    Read the value of a binary DICOM field stored in a sidecar file
+
+    Arguments:
+        bulk_data_dir {Path} -- Directory of relative BulkDataURI
+        bulk_data_uri {str} -- BulkDataURI, a file URI or a filepath
+
+    Raises:
+        ValueError: Sidecar file cannot be found
+
+    Returns:
+        bytes -- DICOM field value
+    """
+    if bulk_data_uri.startswith("file:"):
+        from urllib.request import url2pathname  # pylint: disable=import-outside-toplevel
+        bulk_data_filepath = Path(url2pathname(urlparse(bulk_data_uri).path))
+    else:
+        bulk_data_filepath = bulk_data_dir / Path(bulk_data_uri)
+    if not bulk_data_filepath.is_file():
+        bulk_data_not_exists = "'{}' bulk data file does not exists, abort json2dicom execution!".format(
+            bulk_data_filepath)
+        raise ValueError(bulk_data_not_exists)
+    with open(bulk_data_filepath, "rb") as bulk_data_file:
+        return bulk_data_file.read()
+
+
+def parse_dataset(data_dict, bulk_data_dir=None):
+    """parse_dataset
+    Create a dataset from DICOM fields described as JSON
+
+    Arguments:
+        data_dict {dict} -- DICOM fields described as JSON
+
+    Keyword Arguments:
+        bulk_data_dir {Path} -- Directory of relative BulkDataURI
+            (default: {None}, the current directory)
+
+    Raises:
+        ValueError: Invalid value in the JSON data
+
+    Returns:
+        Dataset -- Parsed dataset
+    """
+    try:
+        return Dataset().from_json(
+            data_dict, partial(read_bulk_data, bulk_data_dir or Path()))
+    except (json.JSONDecodeError, TypeError, ValueError) as exception_error:
+        exception_error = "Error encountered during JSON parsing: \"{}\", abort json2dicom execution!".format(
+            exception_error)
+        raise ValueError(exception_error)
+
+
+def load_dataset(input_filepath, data_dict, bulk_data_dir=None, file_timings=None):
+    """load_dataset
+    Remove invalid DICOM fields from data_dict and create a dataset from
+    the remaining ones
+
+    Arguments:
+        input_filepath {str} -- Input JSON file, used in warnings
+        data_dict {dict} -- DICOM fields described as JSON
+
+    Keyword Arguments:
+        bulk_data_dir {Path} -- Directory of relative BulkDataURI
+            (default: {None}, the current directory)
+        file_timings {FileTimings} -- Timings of the validate and parse
+            stages (default: {None})
+
+    Raises:
+        ValueError: Invalid value in the JSON data
+
+    Returns:
+        Dataset -- Parsed dataset
+    """
+    with measure(file_timings, Stage.VALIDATE):
+        remove_invalid_fields(input_filepath, data_dict)
+    with measure(file_timings, Stage.PARSE):
+        try:
+            return Dataset().from_json(
+                data_dict, partial(read_bulk_data, bulk_data_dir or Path()))
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            # A field is standard with its VR but still rejected by pydicom
+            remove_unparsable_fields(input_filepath, data_dict, bulk_data_dir)
+        return parse_dataset(data_dict, bulk_data_dir)
+
+
+def override_dataset(input_filepath, dicom_dataset, data_dict, bulk_data_dir=None,
+                     file_timings=None):
+    """override_dataset
+    Override fields of a dataset with DICOM fields described as JSON. A
+    field whose new value is invalid is removed from the dataset, like when
+    the template and its overrides were merged before being parsed
+
+    Arguments:
+        input_filepath {str} -- Input JSON file, used in warnings
+        dicom_dataset {Dataset} -- Dataset updated in place
+        data_dict {dict} -- DICOM fields described as JSON, not modified
+
+    Keyword Arguments:
+        bulk_data_dir {Path} -- Directory of relative BulkDataURI
+            (default: {None}, the current directory)
+        file_timings {FileTimings} -- Timings of the validate and parse
+            stages (default: {None})
+
+    Raises:
+        ValueError: Invalid value in the JSON data
+    """
+    valid_data_dict = dict(data_dict)
+    dicom_dataset.update(load_dataset(
+        input_filepath, valid_data_dict, bulk_data_dir, file_timings))
+    for dicom_json_tag in data_dict.keys() - valid_data_dict.keys():
+        tag = parse_tag(dicom_json_tag)
+        if tag is not None and tag in dicom_dataset:
+            del dicom_dataset[tag]
+
+
+def set_image(dicom_dataset, image):
+    """set_image
+    Describe an image in the dataset fields. PixelData is removed from the
+    dataset, its new value is returned to be written after the other fields
+
+    Arguments:
+        dicom_dataset {Dataset} -- DICOM dataset
+        image {np.ndarray} -- Array of shape (rows, columns) or
+            (frames, rows, columns)
+
+    Returns:
+        memoryview -- PixelData value
+    """
+    shape = image.shape
+    bit_depth = 8 * image.dtype.itemsize
+
+    dicom_dataset.BitsAllocated = bit_depth
+    dicom_dataset.BitsStored = bit_depth
+    dicom_dataset.HighBits = bit_depth - 1
+    dicom_dataset.Rows = shape[-2]
+    dicom_dataset.Columns = shape[-1]
+    if len(shape) == 3 or 'NumberOfFrames' in dicom_dataset:
+        dicom_dataset.NumberOfFrames = shape[0] if len(shape) == 3 else 1
+    if 'PixelData' in dicom_dataset:
+        del dicom_dataset.PixelData
+    return pixel_data_buffer(image)
+
+
+def write_dicom(dicom_file, dicom_dataset, dicom_meta, pixel_data=None, file_timings=None):
+    """write_dicom
+    Write a dataset in explicit VR little endian, with a preamble. pydicom
+    deflates the dataset when the file meta information transfer syntax
+    is deflated
+
+    Arguments:
+        dicom_file {file} -- File opened in binary mode
+        dicom_dataset {Dataset} -- DICOM dataset, without PixelData when
+            pixel_data is given
+        dicom_meta {Dataset} -- File meta information
+
+    Keyword Arguments:
+        pixel_data {memoryview} -- PixelData value written after the other
+            fields, from its buffer when the transfer syntax is explicit VR
+            little endian (default: {None})
+        file_timings {FileTimings} -- Timings of the serialize stage, the
+            fields before PixelData, and of the write stage (default: {None})
+    """
+    dataset = FileDataset(getattr(dicom_file, "name", IN_MEMORY_NAME),
+                          dicom_dataset, file_meta=dicom_meta,
+                          preamble=b"\0" * DicomConstants.PREAMBLE_LENGTH.value)
+    dataset.is_little_endian = True
+    dataset.is_implicit_VR = False
+    if pixel_data is not None and (
+            dicom_meta.get("TransferSyntaxUID", ExplicitVRLittleEndian) != ExplicitVRLittleEndian
+            or any(tag > PIXEL_DATA_TAG for tag in dataset.keys())):
+        # Deflated datasets or fields stored after PixelData, let pydicom
+        # sort and encode them
+        dataset.PixelData = pixel_data
+        pixel_data = None
+    with measure(file_timings, Stage.SERIALIZE):
+        dataset.save_as(dicom_file)
+    if pixel_data is not None:
+        with measure(file_timings, Stage.WRITE):
+            write_pixel_data(dicom_file, pixel_data, dataset.BitsAllocated)
+
+
+def json_to_datasets(template_json, data=None, bulk_data_dir=None,
+                     input_filepath=IN_MEMORY_NAME):
+    """json_to_datasets
+    Parse a dicom2json template, overridden by the fields of data
+
+    Arguments:
+        template_json {dict} -- Template with 'meta' and 'data' keys
+
+    Keyword Arguments:
+        data {dict} -- DICOM fields described as JSON, overriding the
+            template fields (default: {None})
+        bulk_data_dir {Path} -- Directory of relative BulkDataURI
+            (default: {None}, the current directory)
+        input_filepath {str} -- Name of the data in warnings
+            (default: {IN_MEMORY_NAME})
+
+    Raises:
+        ValueError: Invalid value in the JSON data
+
+    Returns:
+        tuple -- Dataset and file meta information dataset
+    """
+    dicom_dataset = load_dataset(
+        input_filepath, dict(template_json[JsonConstants.DATA.value]), bulk_data_dir)
+    dicom_meta = parse_dataset(template_json[JsonConstants.META.value])
+    if data:
+        override_dataset(input_filepath, dicom_dataset, data, bulk_data_dir)
+    return dicom_dataset, dicom_meta
+
+
+def json_to_dicom(template_json, image=None, data=None, output=None, bulk_data_dir=None):
+    """json_to_dicom
+    Convert a dicom2json template and a pixel array to DICOM data
+
+    Arguments:
+        template_json {dict} -- Template with 'meta' and 'data' keys
+
+    Keyword Arguments:
+        image {np.ndarray} -- Array of shape (rows, columns) or
+            (frames, rows, columns) (default: {None}, template PixelData)
+        data {dict} -- DICOM fields described as JSON, overriding the
+            template fields (default: {None})
+        output {file} -- File opened in binary mode (default: {None},
+            the DICOM data is returned)
+        bulk_data_dir {Path} -- Directory of relative BulkDataURI
+            (default: {None}, the current directory)
+
+    Raises:
+        ValueError: Invalid value in the JSON data
+
+    Returns:
+        bytes -- DICOM data, None when written to output
+    """
+    dicom_dataset, dicom_meta = json_to_datasets(template_json, data, bulk_data_dir)
+    pixel_data = None if image is None else set_image(dicom_dataset, image)
+    if output is not None:
+        write_dicom(output, dicom_dataset, dicom_meta, pixel_data)
+        return None
+    dicom_buffer = BytesIO()
+    write_dicom(dicom_buffer, dicom_dataset, dicom_meta, pixel_data)
+    return dicom_buffer.getvalue()
@@ -1,136 +1,281 @@
 #!/usr/bin/env python3
 
 import argparse
-from dataclasses import dataclass
-import json
+import base64
+from contextlib import nullcontext
+import dataclasses
+from functools import partial
 import logging
-from logging import config
+import multiprocessing
+import os
 from pathlib import Path
-import cv2
-import numpy as np
-import yaml
-from pydicom import dcmread
 from pydicom.errors import InvalidDicomError
-from constants import DicomConstants, JsonConstants, PngConstants
+from constants import (BulkDataConstants, ImageFormat, JsonConstants, JsonLinesConstants,
+                       JsonStyle, ManifestFormat, PngStrategy, Stage)
+from conversion import dataset_to_json, read_dicom, resolve_dicom_fields
+from discovery import iter_input_files, unique_output_names
+from image_io import (PIXEL_DATA_TAG, PNG_PRESETS, expected_pixel_data_length, frames_memmap,
+                      frames_view, is_pixel_data_length_valid,
+                      read_dataset_and_locate_pixel_data, write_image)
+from json_backend import get_json_backend
+from logging_setup import (add_logging_arguments, configure_logging, init_worker_logging,
+                           worker_log_queue)
+from manifest import (DicomConvertedData, JsonLinesManifestWriter, JsonManifestWriter,
+                      file_sha256, read_converted_data)
+from metrics import add_metrics_arguments, metrics_from_args
+from prefetch import BoundedPrefetch, prefetch_limit
+from timing import FileTimings, RunSummary
 
 DEFAULT_OUTPUT_DIR = Path(__file__).parent / Path("output")
+# Number of files sent at once to a worker process
+DEFAULT_CHUNKSIZE = 8
+# Size of the blocks copied from a DICOM file to a sidecar file
+COPY_BUFFER_SIZE = 1 << 20
 
-# Load logger configuration from YAML file
-with open(Path(__file__).parent / Path("logger_config.yaml"), 'rt') as f:
-    config_data = yaml.safe_load(f.read())
-    config.dictConfig(config_data)
 # Get basic logger
 logger = logging.getLogger('root')
 
 
-def my_json_dumps(data):
+def my_json_dumps(data, json_style=JsonStyle.PRETTY, json_backend=None):
     """my_json_dumps
     JSON formatter
 
     Arguments:
         data {str} -- Data to JSON beautify
 
+    Keyword Arguments:
+        json_style {JsonStyle} -- Output layout (default: {JsonStyle.PRETTY})
+        json_backend {object} -- JSON backend, the fastest available
+            backend if None (default: {None})
+
+    Returns:
+        bytes -- Data formatted
+    """
+    if json_backend is None:
+        json_backend = get_json_backend()
+    return json_backend.dumps(data, json_style)
+
+
+def write_bulk_data(output_filepath, bulk_data_files, data_element):
+    """write_bulk_data
+    Write a binary DICOM field value into a sidecar file
+
+    Arguments:
+        output_filepath {Path} -- Output filepath without suffix
+        bulk_data_files {list} -- Sidecar files already written for this dataset
+        data_element {DataElement} -- Binary DICOM field
+
+    Returns:
+        str -- BulkDataURI, relative to the JSON file directory
+    """
+    bulk_data_filepath = format_bulk_data_filepath(
+        output_filepath, bulk_data_files, data_element.tag)
+    with open(str(bulk_data_filepath), "wb") as bulk_data_file:
+        bulk_data_file.write(data_element.value)
+    return bulk_data_filepath.name
+
+
+def format_bulk_data_filepath(output_filepath, bulk_data_files, tag):
+    """format_bulk_data_filepath
+    Format a sidecar filepath, unique for the dataset, and register it
+
+    Arguments:
+        output_filepath {Path} -- Output filepath without suffix
+        bulk_data_files {list} -- Sidecar files already written for this dataset
+        tag {int} -- DICOM tag of the binary field
+
     Returns:
-        str -- Data beautified
+        Path -- Sidecar filepath
     """
-    return json.dumps(data, indent=2, sort_keys=True)
+    bulk_data_filepath = output_filepath.parent / "{}_{:08X}_{}{}".format(
+        output_filepath.name, tag, len(bulk_data_files),
+        BulkDataConstants.SUFFIX.value)
+    bulk_data_files.append(bulk_data_filepath)
+    return bulk_data_filepath
 
 
-@dataclass
-class DicomConvertedData:
-    """Class for keeping track of converted DICOM items"""
-    image: str
-    output: str
-    template: str
+def pixel_data_to_json(input_file, pixel_data_location, output_filepath,
+                       bulk_data_files, bulk_data_threshold):
+    """pixel_data_to_json
+    Describe a PixelData value which is not loaded in the dataset as a DICOM
+    JSON Model attribute, like Dataset.to_json_dict does. The value is
+    copied block by block into a sidecar file, so it is never loaded in
+    memory, unless it is smaller than the bulk data threshold
+
+    Arguments:
+        input_file {Path} -- DICOM file location
+        pixel_data_location {PixelDataLocation} -- PixelData value position
+        output_filepath {Path} -- Output filepath without suffix
+        bulk_data_files {list} -- Sidecar files already written for this dataset
+        bulk_data_threshold {int} -- Size of base64 encoded values written
+            inline, None to always write the value into a sidecar file
+
+    Returns:
+        dict -- DICOM JSON Model attribute
+    """
+    pixel_data_json = {"vr": pixel_data_location.vr}
+    if not pixel_data_location.length:
+        return pixel_data_json
+
+    with open(str(input_file), "rb") as dicom_file:
+        dicom_file.seek(pixel_data_location.offset)
+        encoded_length = 4 * ((pixel_data_location.length + 2) // 3)
+        if bulk_data_threshold is None or encoded_length > bulk_data_threshold:
+            bulk_data_filepath = format_bulk_data_filepath(
+                output_filepath, bulk_data_files, PIXEL_DATA_TAG)
+            with open(str(bulk_data_filepath), "wb") as bulk_data_file:
+                remaining_length = pixel_data_location.length
+                while remaining_length:
+                    buffer = dicom_file.read(
+                        min(COPY_BUFFER_SIZE, remaining_length))
+                    if not buffer:
+                        raise EOFError("{} PixelData is truncated".format(input_file))
+                    bulk_data_file.write(buffer)
+                    remaining_length -= len(buffer)
+            pixel_data_json["BulkDataURI"] = bulk_data_filepath.name
+        else:
+            pixel_data_json["InlineBinary"] = base64.b64encode(
+                dicom_file.read(pixel_data_location.length)).decode("utf-8")
+    return pixel_data_json
 
 
-def convert_dicom_to_data(input_file, remove_dicom_fields, converted_data):
+def convert_dicom_to_data(input_file, remove_dicom_fields, metadata_only=False,
+                          bulk_data_threshold=None, json_style=JsonStyle.PRETTY,
+                          json_backend=None, image_format=ImageFormat.PNG,
+                          mmap_pixel_data=False, png_options=None, output_name=None):
     """
     Convert DICOM file to JSON using pydicom library
 
     Arguments:
         input_file {str} -- DICOM file location
-        remove_dicom_fields {list} -- DICOM field name to not save in JSON
-        converted_data {list} -- DicomConvertedData items list
+        remove_dicom_fields {list} -- DICOM field names or DicomFieldFilter
+            items to not save in JSON
+
+    Keyword Arguments:
+        metadata_only {bool} -- Skip the PixelData value of the file and do
+            not extract the image (default: {False})
+        bulk_data_threshold {int} -- Size of base64 encoded binary values
+            above which values are written into sidecar files, referenced
+            by a BulkDataURI (default: {None}, every value is inline)
+        json_style {JsonStyle} -- JSON file layout (default: {JsonStyle.PRETTY})
+        json_backend {object} -- JSON backend (default: {None})
+        image_format {ImageFormat} -- Image file format, frames of a
+            multi-frame image are written to numbered PNG files or to a
+            single NPY file (default: {ImageFormat.PNG})
+        mmap_pixel_data {bool} -- Map uncompressed PixelData from the file
+            instead of loading it in memory (default: {False})
+        png_options {PngOptions} -- PNG encoder settings (default: {None},
+            OpenCV defaults)
+        output_name {str} -- Name of the output files without suffix
+            (default: {None}, the DICOM file name without suffix)
+
+    Returns:
+        DicomConvertedData -- Converted DICOM item, with the timings of
+            its conversion stages
     """
     try:
-        dicom_dataset = dcmread(str(input_file))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Convert %s", str(input_file.resolve()))
+        file_timings = FileTimings()
+        pixel_data_location = None
+        with file_timings.measure(Stage.READ):
+            if mmap_pixel_data and not metadata_only:
+                dicom_dataset, pixel_data_location = read_dataset_and_locate_pixel_data(
+                    input_file)
+            else:
+                dicom_dataset = read_dicom(input_file, metadata_only)
+        file_timings.bytes_in = input_file.stat().st_size
 
         # Extract DICOM data
-        rows = dicom_dataset.get('Rows')
-        columns = dicom_dataset.get('Columns')
-        pixel_data = dicom_dataset.get('PixelData')
-        bits_stored = dicom_dataset.get('BitsStored')
-        pixel_data_length = None
-        pixel_data_expected_length = None
-        if pixel_data and rows and columns and bits_stored:
-            pixel_data_length = len(pixel_data)
-            pixel_data_expected_length = rows * columns * (bits_stored / 8)
+        with file_timings.measure(Stage.VALIDATE):
+            rows = dicom_dataset.get('Rows')
+            columns = dicom_dataset.get('Columns')
+            pixel_data = dicom_dataset.get('PixelData')
+            if pixel_data_location is not None and pixel_data_location.length:
+                pixel_data = pixel_data_location
+            bits_stored = dicom_dataset.get('BitsStored')
+            bits_allocated = dicom_dataset.get('BitsAllocated') or bits_stored
+            number_of_frames = int(dicom_dataset.get('NumberOfFrames') or 1)
+            pixel_data_length = None
+            pixel_data_expected_length = None
+            if pixel_data and rows and columns and bits_stored:
+                if pixel_data_location is not None:
+                    pixel_data_length = pixel_data_location.length
+                else:
+                    pixel_data_length = len(pixel_data)
+                pixel_data_expected_length = expected_pixel_data_length(
+                    rows, columns, number_of_frames, bits_allocated)
 
         # Format output filepath
-        output_filepath = (DEFAULT_OUTPUT_DIR / input_file.stem)
+        if output_name is None:
+            output_name = input_file.stem
+        output_filepath = (DEFAULT_OUTPUT_DIR / output_name)
+        output_filename = output_name + input_file.suffix
         output_dataset_filepath = output_filepath.with_suffix(
             JsonConstants.SUFFIX.value)
-        output_image_filepath = output_filepath.with_suffix(
-            PngConstants.SUFFIX.value)
-
-        # Remove DICOM fields specified by the user
-        if remove_dicom_fields:
-            for dicom_fields_name in remove_dicom_fields:
-                if dicom_dataset.get(dicom_fields_name):
-                    dicom_dataset.pop(dicom_fields_name)
-                else:
-                    dicom_error = "Unrecognized DICOM field named '{}'".format(
-                        dicom_fields_name)
-                    logger.warning(dicom_error)
+
+        # Remove DICOM fields specified by the user and describe the others,
+        # pydicom decodes the field values while they are described
+        with file_timings.measure(Stage.PARSE):
+            remove_dicom_fields = resolve_dicom_fields(remove_dicom_fields)
+            bulk_data_files = []
+            dicom_json = dataset_to_json(
+                dicom_dataset, remove_dicom_fields, bulk_data_threshold,
+                partial(write_bulk_data, output_filepath, bulk_data_files))
+            if pixel_data_location is not None and not any(
+                    dicom_field_filter.matches(PIXEL_DATA_TAG)
+                    for dicom_field_filter in remove_dicom_fields):
+                dicom_json[JsonConstants.DATA.value]["{:08X}".format(PIXEL_DATA_TAG)] = pixel_data_to_json(
+                    input_file, pixel_data_location, output_filepath,
+                    bulk_data_files, bulk_data_threshold)
+        file_timings.bytes_out += sum(os.path.getsize(bulk_data_filepath)
+                                      for bulk_data_filepath in bulk_data_files)
 
         # Write dataset JSON file
-        dicom_dataset_to_json_meta = dicom_dataset.file_meta.to_json_dict()
-        dicom_dataset_to_json = dicom_dataset.to_json_dict()
-        dicom_json_file = open(str(output_dataset_filepath), "w")
-        dicom_json_file.write(my_json_dumps(
-            {
-                JsonConstants.META.value: dicom_dataset_to_json_meta,
-                JsonConstants.DATA.value: dicom_dataset_to_json
-            }))
-        dicom_json_file.close()
+        with file_timings.measure(Stage.SERIALIZE):
+            dicom_json_data = my_json_dumps(dicom_json, json_style, json_backend)
+        with file_timings.measure(Stage.WRITE):
+            dicom_json_file = open(str(output_dataset_filepath), "wb")
+            dicom_json_file.write(dicom_json_data)
+            dicom_json_file.close()
+        file_timings.bytes_out += len(dicom_json_data)
+
+        if metadata_only:
+            return DicomConvertedData(
+                None, output_filename, str(output_dataset_filepath), timings=file_timings)
 
         # Create image only if Rows, Columns, BitsStored and PixelData are filled
         if rows and columns and pixel_data and bits_stored:
-            # Extract image from PixelData DICOM file
-            img_dtype = None
-            if bits_stored == 8:
-                img_dtype = np.uint8
-            elif bits_stored == 16:
-                img_dtype = np.uint16
-            else:
-                bits_stored_error = "Unrecognized DICOM BitsStored value '{}'".format(
-                    bits_stored)
-                raise ValueError(bits_stored_error)
-
             # Check buffer size consistancy
-            if not pixel_data_length == int(pixel_data_expected_length):
+            if not is_pixel_data_length_valid(pixel_data_length, pixel_data_expected_length):
                 logger.error("%s buffer size is not consistent",
                              str(input_file.resolve()))
-                converted_data.append(DicomConvertedData(
-                    None, input_file.name, str(output_dataset_filepath)))
-                return
-
-            # Write image PNG file
-            dicom_image = np.ndarray((rows, columns),
-                                     img_dtype,
-                                     pixel_data)
-            cv2.imwrite(str(output_image_filepath),
-                        dicom_image)  # pylint: disable=E1101
-
-            # Add full data in the main list
-            converted_data.append(DicomConvertedData(
-                str(output_image_filepath), input_file.name, str(output_dataset_filepath)))
+                # Same error as the one raised by dicom_to_json
+                return DicomConvertedData(
+                    None, output_filename, str(output_dataset_filepath), timings=file_timings,
+                    error_type=ValueError.__name__)
+
+            # Write image files, frames are views into PixelData
+            with file_timings.measure(Stage.PIXEL_ENCODE):
+                if pixel_data_location is not None:
+                    frames = frames_memmap(input_file, pixel_data_location, rows, columns,
+                                           number_of_frames, bits_allocated)
+                else:
+                    frames = frames_view(pixel_data, rows, columns,
+                                         number_of_frames, bits_allocated)
+                output_image = write_image(frames, output_filepath, image_format,
+                                           png_options)
+            output_images = output_image if isinstance(output_image, list) else [output_image]
+            file_timings.bytes_out += sum(os.path.getsize(output_image_filepath)
+                                          for output_image_filepath in output_images)
+
+            return DicomConvertedData(
+                output_image, output_filename, str(output_dataset_filepath), timings=file_timings)
         else:
             logger.warning("%s has no Rows or Columns or BitsStored or PixelData DICOM fields", str(
                 input_file.resolve()))
-            converted_data.append(DicomConvertedData(
-                None, input_file.name, str(output_dataset_filepath)))
+            return DicomConvertedData(
+                None, output_filename, str(output_dataset_filepath), timings=file_timings)
     except (FileNotFoundError,
             InvalidDicomError,
             PermissionError,
@@ -138,36 +283,220 @@ def convert_dicom_to_data(input_file, remove_dicom_fields, converted_data):
         raise error
 
 
-def dicom2json(input_files, remove_dicom_fields):
+def convert_named_dicom_to_data(task, **convert_options):
+    """
+    Convert a DICOM file to output files with the given name
+
+    Arguments:
+        task {tuple} -- DICOM file location and its output name
+
+    Keyword Arguments:
+        convert_options -- convert_dicom_to_data keyword arguments
+
+    Returns:
+        DicomConvertedData -- Converted DICOM item
+    """
+    input_file, output_name = task
+    return convert_dicom_to_data(input_file, output_name=output_name, **convert_options)
+
+
+def convert_changed_dicom_to_data(task, use_hash=False, **convert_options):
+    """
+    Convert a DICOM file only if it changed since its previous conversion
+
+    Arguments:
+        task {tuple} -- DICOM file location, its output name and its
+            previous DicomConvertedData, None if it was never converted
+
+    Keyword Arguments:
+        use_hash {bool} -- Compare the SHA-256 digest of files whose
+            modification time changed (default: {False})
+        convert_options -- convert_dicom_to_data keyword arguments
+
+    Returns:
+        DicomConvertedData -- Converted DICOM item
+    """
+    input_file, output_name, previous_data = task
+    source_stat = input_file.stat()
+    sha256 = None
+    if (previous_data is not None
+            and previous_data.size == source_stat.st_size
+            and previous_data.outputs_exist()):
+        if previous_data.mtime == source_stat.st_mtime_ns:
+            logger.debug("Skip unchanged %s", previous_data.source)
+            return previous_data
+        if use_hash and previous_data.sha256:
+            sha256 = file_sha256(input_file)
+            if sha256 == previous_data.sha256:
+                logger.debug("Skip unchanged %s", previous_data.source)
+                previous_data.mtime = source_stat.st_mtime_ns
+                return previous_data
+
+    converted_data = convert_dicom_to_data(input_file, output_name=output_name,
+                                           **convert_options)
+    converted_data.source = os.path.abspath(str(input_file))
+    converted_data.size = source_stat.st_size
+    converted_data.mtime = source_stat.st_mtime_ns
+    if use_hash:
+        converted_data.sha256 = sha256 or file_sha256(input_file)
+    return converted_data
+
+
+def manifest_filepath(manifest_format):
+    """manifest_filepath
+    Format the '_dicom2json' manifest filepath
+
+    Arguments:
+        manifest_format {ManifestFormat} -- Manifest file format
+
+    Returns:
+        Path -- Manifest filepath
+    """
+    if manifest_format == ManifestFormat.JSONL:
+        suffix = JsonLinesConstants.SUFFIX.value
+    else:
+        suffix = JsonConstants.SUFFIX.value
+    return (DEFAULT_OUTPUT_DIR / Path("_dicom2json")).with_suffix(suffix)
+
+
+def open_manifest(manifest_format, json_style, json_backend):
+    """open_manifest
+    Create the writer of the '_dicom2json' manifest
+
+    Arguments:
+        manifest_format {ManifestFormat} -- Manifest file format
+        json_style {JsonStyle} -- JSON layout, JSON Lines are always compact
+        json_backend {object} -- JSON backend
+
+    Returns:
+        object -- Manifest writer, to use as a context manager
+    """
+    if manifest_format == ManifestFormat.JSONL:
+        return JsonLinesManifestWriter(
+            manifest_filepath(manifest_format), json_backend)
+    return JsonManifestWriter(
+        manifest_filepath(manifest_format), json_backend, json_style)
+
+
+def write_converted_data(manifest, summary, converted_data, manifest_timings=False,
+                         metrics=None):
+    """write_converted_data
+    Add a converted item to the run summary and to the manifest. Metrics
+    count it as a failure when its error was only logged
+
+    Arguments:
+        manifest {object} -- Manifest writer
+        summary {RunSummary} -- Summary of the run
+        converted_data {DicomConvertedData} -- Converted item
+
+    Keyword Arguments:
+        manifest_timings {bool} -- Write the timings of the item in the
+            manifest (default: {False})
+        metrics {MetricsExporter} -- Metrics of the run (default: {None})
+    """
+    summary.add(converted_data.timings)
+    if metrics is not None:
+        if converted_data.error_type is not None:
+            metrics.add_failure(converted_data.error_type)
+        else:
+            metrics.add(converted_data.timings)
+    if not manifest_timings:
+        converted_data.timings = None
+    manifest.write(converted_data)
+
+
+def dicom2json(input_files, remove_dicom_fields, workers=1, metadata_only=False,
+               bulk_data_threshold=None, json_style=JsonStyle.PRETTY,
+               json_backend=None, manifest_format=ManifestFormat.JSON,
+               incremental=False, use_hash=False, image_format=ImageFormat.PNG,
+               mmap_pixel_data=False, png_options=None, manifest_timings=False,
+               metrics=None):
     """
     Convert DICOM file to JSON using pydicom library
 
     Arguments:
-        input_files {str} -- DICOM files location
+        input_files {iterable} -- DICOM files location, or DICOM files
+            location and output name yielded by iter_input_files, may be a
+            generator which is consumed while files are converted
         remove_dicom_fields {list} -- DICOM field name to not save in JSON
+
+    Keyword Arguments:
+        workers {int} -- Number of worker processes (default: {1})
+        metadata_only {bool} -- Do not read PixelData (default: {False})
+        bulk_data_threshold {int} -- Size of base64 encoded binary values
+            written into sidecar files (default: {None})
+        json_style {JsonStyle} -- JSON files layout (default: {JsonStyle.PRETTY})
+        json_backend {object} -- JSON backend, the fastest available
+            backend if None (default: {None})
+        manifest_format {ManifestFormat} -- '_dicom2json' manifest format,
+            JSON Lines are written file by file (default: {ManifestFormat.JSON})
+        incremental {bool} -- Only convert files which are new or changed
+            since the previous incremental run (default: {False})
+        use_hash {bool} -- Record the SHA-256 digest of converted files to
+            detect unchanged files whose modification time changed (default: {False})
+        image_format {ImageFormat} -- Image file format (default: {ImageFormat.PNG})
+        mmap_pixel_data {bool} -- Map uncompressed PixelData from the files
+            instead of loading it in memory (default: {False})
+        png_options {PngOptions} -- PNG encoder settings (default: {None},
+            OpenCV defaults)
+        manifest_timings {bool} -- Write the stage timings of each converted
+            file in the manifest (default: {False})
+        metrics {MetricsExporter} -- Metrics exported while files are
+            converted (default: {None})
     """
     try:
-        converted_data = []
-        for input_file in input_files:
-            logger.debug("Convert %s", str(input_file.resolve()))
-            convert_dicom_to_data(
-                input_file, remove_dicom_fields, converted_data)
-
-        output_template_filepath = (DEFAULT_OUTPUT_DIR / Path("_dicom2json")).with_suffix(
-            JsonConstants.SUFFIX.value)
-
-        # Write template file
-        converted_data_json_object = []
-        for data in converted_data:
-            converted_data_json_object.append({
-                JsonConstants.TEMPLATE.value: data.template,
-                JsonConstants.IMAGE.value: data.image,
-                JsonConstants.OUTPUT.value: data.output
-            })
-        dicom_json_template_file = open(output_template_filepath, "w")
-        dicom_json_template_file.write(
-            my_json_dumps(converted_data_json_object))
-        dicom_json_template_file.close()
+        summary = RunSummary()
+        if metrics is not None:
+            metrics.set_workers(workers)
+        if json_backend is None:
+            json_backend = get_json_backend()
+        # Output files are named after the input files, a file must not
+        # overwrite the output of another one
+        input_files = unique_output_names(input_files)
+        # Field names are resolved to tags before the first file
+        remove_dicom_fields = resolve_dicom_fields(remove_dicom_fields)
+        convert = partial(convert_named_dicom_to_data,
+                          remove_dicom_fields=remove_dicom_fields,
+                          metadata_only=metadata_only,
+                          bulk_data_threshold=bulk_data_threshold,
+                          json_style=json_style,
+                          json_backend=json_backend,
+                          image_format=image_format,
+                          mmap_pixel_data=mmap_pixel_data,
+                          png_options=png_options)
+        if incremental:
+            # Read the previous manifest before it is overwritten
+            previous_data = read_converted_data(
+                manifest_filepath(manifest_format), json_backend)
+            input_files = ((input_file, output_name,
+                            previous_data.get(os.path.abspath(str(input_file))))
+                           for input_file, output_name in input_files)
+            convert = partial(convert_changed_dicom_to_data,
+                              use_hash=use_hash, **convert.keywords)
+        with metrics or nullcontext(), \
+                open_manifest(manifest_format, json_style, json_backend) as manifest:
+            if workers > 1:
+                # Results are yielded in the input order, whatever the worker
+                # which converted them
+                with worker_log_queue() as log_queue:
+                    with multiprocessing.Pool(workers,
+                                              initializer=init_worker_logging,
+                                              initargs=(log_queue, logging.getLogger().level)) as pool:
+                        # Directories are walked only a few chunks ahead of the workers
+                        with BoundedPrefetch(input_files, prefetch_limit(
+                                workers, DEFAULT_CHUNKSIZE)) as prefetch:
+                            for converted_data in pool.imap(
+                                    convert, prefetch, chunksize=DEFAULT_CHUNKSIZE):
+                                write_converted_data(manifest, summary, converted_data,
+                                                     manifest_timings, metrics)
+                                prefetch.release()
+                        pool.close()
+                        pool.join()
+            else:
+                for task in input_files:
+                    write_converted_data(manifest, summary, convert(task),
+                                         manifest_timings, metrics)
+        summary.log()
 
         logger.debug("Output files for have been writed at: '%s'",
                      DEFAULT_OUTPUT_DIR)
@@ -199,7 +528,8 @@ def main():
     # Optionals arguments
     remove_dicom_fields_help = "remove DICOM fields after extraction. \
         The list of possible values is available in the file '_dicom_dict.py' at \
-            the root of the folder where the 'Keyword' for each field is specified."
+            the root of the folder where the 'Keyword' for each field is specified. \
+                A tag written as 8 hexadecimal characters is also accepted."
     parser.add_argument(
         "-rdf",
         "--remove_dicom_fields",
@@ -207,30 +537,170 @@ def main():
         type=str,
         help=remove_dicom_fields_help,
         default=None)
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="number of worker processes used to convert DICOM files",
+        default=1)
+    metadata_only_help = "only convert DICOM fields to JSON. The PixelData value \
+        is skipped, so no image is extracted."
+    parser.add_argument(
+        "-mo",
+        "--metadata-only",
+        action="store_true",
+        help=metadata_only_help)
+    bulk_data_threshold_help = "write binary DICOM fields (OB, OW, UN...) whose \
+        base64 encoded value is larger than this size, in bytes, into '.bin' \
+            sidecar files referenced by a BulkDataURI in the JSON file."
+    parser.add_argument(
+        "-bdt",
+        "--bulk-data-threshold",
+        type=int,
+        help=bulk_data_threshold_help,
+        default=None)
+    parser.add_argument(
+        "-js",
+        "--json-style",
+        choices=[json_style.value for json_style in JsonStyle],
+        help="layout of written JSON files, 'compact' files are not indented and their keys are not sorted",
+        default=JsonStyle.PRETTY.value)
+    parser.add_argument(
+        "-jb",
+        "--json-backend",
+        choices=["auto", "json", "orjson"],
+        help="library used to write JSON files, 'auto' uses orjson when installed",
+        default="auto")
+    manifest_format_help = "format of the '_dicom2json' manifest, 'jsonl' writes \
+        one line per file as soon as the file is converted."
+    parser.add_argument(
+        "-mf",
+        "--manifest-format",
+        choices=[manifest_format.value for manifest_format in ManifestFormat],
+        help=manifest_format_help,
+        default=ManifestFormat.JSON.value)
+    incremental_help = "only convert files which are new or changed since the \
+        previous incremental run. Size and modification time of each file are \
+            recorded in the '_dicom2json' manifest."
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help=incremental_help)
+    parser.add_argument(
+        "--hash",
+        action="store_true",
+        help="with --incremental, also record the SHA-256 digest of each file to skip unchanged files whose modification time changed")
+    parser.add_argument(
+        "-r",
+        "--recursive",
+        action="store_true",
+        help="also search DICOM files in sub-directories of directories")
+    parser.add_argument(
+        "-dd",
+        "--detect-dicom",
+        action="store_true",
+        help="in directories, also convert files without the '.dcm' suffix which start with the DICOM magic 'DICM'")
+    image_format_help = "format of images extracted from PixelData. Frames of a \
+        multi-frame image are written to numbered 'png' files or to a single 'npy' file. \
+        'raw' writes the pixel bytes without any encoding, json2dicom reads their \
+        dimensions from the template."
+    parser.add_argument(
+        "-if",
+        "--image-format",
+        choices=[image_format.value for image_format in ImageFormat],
+        help=image_format_help,
+        default=ImageFormat.PNG.value)
+    mmap_pixel_data_help = "map PixelData of uncompressed files from the file instead \
+        of loading it in memory. PixelData is copied into a '.bin' sidecar file, \
+        it is only written inline when it is smaller than --bulk-data-threshold."
+    parser.add_argument(
+        "-mm",
+        "--mmap-pixel-data",
+        action="store_true",
+        help=mmap_pixel_data_help)
+    png_preset_help = "PNG encoder settings. 'fast' uses compression level 1, the \
+        'huffman_only' strategy and the 'up' filter, for batch runs whose \
+        throughput matters more than the image size."
+    parser.add_argument(
+        "-pp",
+        "--png-preset",
+        choices=list(PNG_PRESETS),
+        help=png_preset_help,
+        default="default")
+    parser.add_argument(
+        "-pcl",
+        "--png-compression-level",
+        type=int,
+        choices=range(10),
+        metavar="{0-9}",
+        help="PNG compression level, overrides the preset level",
+        default=None)
+    parser.add_argument(
+        "-ps",
+        "--png-strategy",
+        choices=[png_strategy.value for png_strategy in PngStrategy],
+        help="PNG compression strategy, overrides the preset strategy",
+        default=None)
+    manifest_timings_help = "write the duration of each conversion stage, and \
+        the bytes read and written, of each file in the '_dicom2json' manifest."
+    parser.add_argument(
+        "-mt",
+        "--manifest-timings",
+        action="store_true",
+        help=manifest_timings_help)
+    add_logging_arguments(parser)
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
+    configure_logging(log_level=args.log_level, asynchronous=args.async_logging)
     input_files = args.input_files
     remove_dicom_fields = args.remove_dicom_fields
-
-    files = []
+    workers = args.workers
+    if workers < 1:
+        workers_error = "{} is not a valid number of workers, abort dicom2json execution!".format(
+            workers)
+        raise ValueError(workers_error)
+    if args.bulk_data_threshold is not None and args.bulk_data_threshold < 0:
+        bulk_data_threshold_error = "{} is not a valid bulk data threshold, abort dicom2json execution!".format(
+            args.bulk_data_threshold)
+        raise ValueError(bulk_data_threshold_error)
+
+    input_filepaths = []
     for input_file in input_files:
         input_filepath = Path(input_file)
         if not input_filepath.exists():
             input_not_exists_error = "{} does not exists, abort dicom2json execution!".format(
                 input_filepath)
             raise ValueError(input_not_exists_error)
-        if input_filepath.is_file():
-            files.append(input_filepath)
-        elif input_filepath.is_dir():
-            files.extend(list(input_filepath.glob(
-                '*' + DicomConstants.SUFFIX.value)))
-        else:
+        if not input_filepath.is_file() and not input_filepath.is_dir():
             input_is_not_file_error = "{} is not a file, abort dicom2json execution!".format(
                 input_filepath)
             raise ValueError(input_is_not_file_error)
+        input_filepaths.append(input_filepath)
+
+    png_options = PNG_PRESETS[args.png_preset]
+    if args.png_compression_level is not None:
+        png_options = dataclasses.replace(
+            png_options, compression_level=args.png_compression_level)
+    if args.png_strategy is not None:
+        png_options = dataclasses.replace(
+            png_options, strategy=PngStrategy(args.png_strategy))
+
+    # Directories are walked while files are converted
+    files = iter_input_files(
+        input_filepaths, args.recursive, args.detect_dicom)
+
+    metrics = metrics_from_args("dicom2json", args)
 
     try:
-        dicom2json(files, remove_dicom_fields)
+        dicom2json(files, remove_dicom_fields, workers,
+                   args.metadata_only, args.bulk_data_threshold,
+                   JsonStyle(args.json_style), get_json_backend(args.json_backend),
+                   ManifestFormat(args.manifest_format),
+                   args.incremental, args.hash, ImageFormat(args.image_format),
+                   args.mmap_pixel_data, png_options, args.manifest_timings,
+                   metrics)
     except Exception as error:
         raise error
 
@@ -0,0 +1,200 @@
+"""dicom_dictionary
+Gives access to the DICOM data dictionary '_dicom_dict.py' available at
+the root of the repository.
+The dictionary is compiled once into a keyword/tag index cached on disk,
+so the '_dicom_dict' module is only imported when it is modified.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+import importlib.util
+import logging
+import marshal
+import os
+from pathlib import Path
+
+DICOM_DICT_FILEPATH = Path(__file__).parent.parent / Path("_dicom_dict.py")
+INDEX_FILEPATH = Path(__file__).parent / Path("__pycache__") / \
+    Path("_dicom_dict_index.marshal")
+# Increase it when the index layout changes
+INDEX_VERSION = 1
+# Mask matching every bit of a tag
+TAG_MASK = 0xFFFFFFFF
+
+logger = logging.getLogger('root')
+
+
+@dataclass(frozen=True)
+class DicomFieldFilter:
+    """Class for matching DICOM tags of a field, or of a repeater group
+    like '60xx3000'"""
+    name: str
+    mask: int
+    value: int
+
+    def matches(self, tag):
+        """matches
+        Check if a tag belongs to the field
+
+        Arguments:
+            tag {int} -- DICOM tag
+
+        Returns:
+            bool -- True if the tag belongs to the field
+        """
+        return tag & self.mask == self.value
+
+    @property
+    def is_repeater(self):
+        """is_repeater
+        Check if the filter matches several tags
+
+        Returns:
+            bool -- True for a repeater group
+        """
+        return self.mask != TAG_MASK
+
+
+def load_dicom_dict():
+    """load_dicom_dict
+    Import the DICOM data dictionary module
+
+    Returns:
+        module -- '_dicom_dict' module
+    """
+    spec = importlib.util.spec_from_file_location(
+        "_dicom_dict", str(DICOM_DICT_FILEPATH))
+    dicom_dict = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(dicom_dict)
+    return dicom_dict
+
+
+def compile_repeater(repeater_tag):
+    """compile_repeater
+    Convert a repeater tag like '60xx3000' to an integer mask and value
+
+    Arguments:
+        repeater_tag {str} -- Repeater tag, 'x' stands for any hexadecimal digit
+
+    Returns:
+        tuple -- Mask and value
+    """
+    mask = int("".join("0" if digit == "x" else "F" for digit in repeater_tag), 16)
+    value = int(repeater_tag.replace("x", "0"), 16)
+    return mask, value
+
+
+def build_index():
+    """build_index
+    Compile the DICOM data dictionary into plain dicts and lists,
+    which can be serialized with marshal
+
+    Returns:
+        dict -- Index with the following keys:
+            'entries': {tag: (VR, VM, Keyword)}
+            'keywords': {Keyword: tag}
+            'repeaters': [(mask, value, VR, VM, Keyword)]
+    """
+    dicom_dict = load_dicom_dict()
+    entries = {}
+    keywords = {}
+    for tag, (vr, vm, _, _, keyword) in dicom_dict.DicomDictionary.items():
+        entries[tag] = (vr, vm, keyword)
+        if keyword:
+            keywords[keyword] = tag
+    repeaters = []
+    for repeater_tag, (vr, vm, _, _, keyword) in dicom_dict.RepeatersDictionary.items():
+        mask, value = compile_repeater(repeater_tag)
+        repeaters.append((mask, value, vr, vm, keyword))
+    return {
+        "entries": entries,
+        "keywords": keywords,
+        "repeaters": repeaters,
+    }
+
+
+def dicom_dict_key():
+    """dicom_dict_key
+    Identify the current version of the DICOM data dictionary file
+
+    Returns:
+        tuple -- Index version, file modification time and size
+    """
+    dicom_dict_stat = DICOM_DICT_FILEPATH.stat()
+    return (INDEX_VERSION, dicom_dict_stat.st_mtime_ns, dicom_dict_stat.st_size)
+
+
+@lru_cache(maxsize=None)
+def get_index():
+    """get_index
+    Load the DICOM data dictionary index from its cache file, or build it
+    and write the cache file when the dictionary changed
+
+    Returns:
+        dict -- Index, see build_index
+    """
+    key = dicom_dict_key()
+    try:
+        with open(INDEX_FILEPATH, "rb") as index_file:
+            cached_key, index = marshal.load(index_file)
+        if tuple(cached_key) == key:
+            return index
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    index = build_index()
+    try:
+        INDEX_FILEPATH.parent.mkdir(exist_ok=True)
+        temporary_filepath = INDEX_FILEPATH.with_name(
+            "{}.{}".format(INDEX_FILEPATH.name, os.getpid()))
+        with open(temporary_filepath, "wb") as index_file:
+            marshal.dump((key, index), index_file)
+        os.replace(temporary_filepath, INDEX_FILEPATH)
+    except OSError as error:
+        logger.debug("Cannot write DICOM dictionary index: %s", error)
+    return index
+
+
+def dictionary_entry(tag):
+    """dictionary_entry
+    Find the DICOM data dictionary entry of a tag, repeater groups included
+
+    Arguments:
+        tag {int} -- DICOM tag
+
+    Returns:
+        tuple -- (VR, VM, Keyword) or None if unknown
+    """
+    index = get_index()
+    entry = index["entries"].get(tag)
+    if entry is None:
+        for mask, value, vr, vm, keyword in index["repeaters"]:
+            if tag & mask == value:
+                return vr, vm, keyword
+    return entry
+
+
+def resolve_dicom_field(name):
+    """resolve_dicom_field
+    Convert a DICOM field keyword, or a tag written as 8 hexadecimal
+    characters, to a DicomFieldFilter
+
+    Arguments:
+        name {str} -- DICOM field keyword or tag
+
+    Returns:
+        DicomFieldFilter -- Field filter or None if unknown
+    """
+    index = get_index()
+    tag = index["keywords"].get(name)
+    if tag is not None:
+        return DicomFieldFilter(name, TAG_MASK, tag)
+    for mask, value, _, _, keyword in index["repeaters"]:
+        if keyword == name:
+            return DicomFieldFilter(name, mask, value)
+    if len(name) == 8:
+        try:
+            return DicomFieldFilter(name, TAG_MASK, int(name, 16))
+        except ValueError:
+            pass
+    return None
@@ -0,0 +1,191 @@
+"""discovery
+Find DICOM files in the directories given to dicom2json, and check
+DICOM files written by json2dicom
+"""
+
+import logging
+import os
+from pathlib import Path
+import struct
+from pydicom.uid import DeflatedExplicitVRLittleEndian
+from constants import DicomConstants
+from image_io import LONG_LENGTH_VRS, UNDEFINED_LENGTH
+
+# Explicit VR little endian element header: tag, VR and 2 bytes length
+ELEMENT_HEADER = struct.Struct("<HH2sH")
+# Length of the values whose VR has a 4 bytes length
+LONG_LENGTH = struct.Struct("<L")
+# File meta group and TransferSyntaxUID element
+FILE_META_GROUP = 0x0002
+TRANSFER_SYNTAX_UID_ELEMENT = 0x0010
+# Separator of the parts of an output name, like 'series1_IM00001'
+OUTPUT_NAME_SEPARATOR = "_"
+
+logger = logging.getLogger('root')
+
+
+def has_dicom_magic(filepath):
+    """has_dicom_magic
+    Check if a file starts with a DICOM preamble followed by 'DICM'
+
+    Arguments:
+        filepath {str} -- File location
+
+    Returns:
+        bool -- True if the file is a DICOM file
+    """
+    magic_length = len(DicomConstants.MAGIC.value)
+    try:
+        with open(filepath, "rb") as dicom_file:
+            dicom_file.seek(DicomConstants.PREAMBLE_LENGTH.value)
+            return dicom_file.read(magic_length) == DicomConstants.MAGIC.value
+    except OSError:
+        return False
+
+
+def is_complete_dicom_file(filepath):
+    """is_complete_dicom_file
+    Check that an explicit VR little endian file starts with a DICOM
+    preamble and 'DICM', and that its top-level elements end exactly at
+    the end of the file. Values are skipped without being read. The check
+    only covers the elements before the first value of undefined length,
+    and only the file meta group of a deflated file, whose dataset is a
+    compressed stream
+
+    Arguments:
+        filepath {str} -- File location
+
+    Returns:
+        bool -- True if the file is complete
+    """
+    if not has_dicom_magic(filepath):
+        return False
+    offset = DicomConstants.PREAMBLE_LENGTH.value + \
+        len(DicomConstants.MAGIC.value)
+    try:
+        with open(filepath, "rb") as dicom_file:
+            file_size = os.fstat(dicom_file.fileno()).st_size
+            transfer_syntax_uid = None
+            while offset < file_size:
+                dicom_file.seek(offset)
+                header = dicom_file.read(ELEMENT_HEADER.size + LONG_LENGTH.size)
+                if len(header) < ELEMENT_HEADER.size:
+                    return False
+                group, element, vr, length = ELEMENT_HEADER.unpack_from(header)
+                if group != FILE_META_GROUP and \
+                        transfer_syntax_uid == DeflatedExplicitVRLittleEndian:
+                    return True
+                offset += ELEMENT_HEADER.size
+                if group == FILE_META_GROUP and element == TRANSFER_SYNTAX_UID_ELEMENT:
+                    dicom_file.seek(offset)
+                    transfer_syntax_uid = dicom_file.read(length).decode(
+                        "ascii", "replace").rstrip("\0 ")
+                if vr.decode("ascii", "replace") in LONG_LENGTH_VRS:
+                    if len(header) < ELEMENT_HEADER.size + LONG_LENGTH.size:
+                        return False
+                    length, = LONG_LENGTH.unpack_from(header, ELEMENT_HEADER.size)
+                    offset += LONG_LENGTH.size
+                    if length == UNDEFINED_LENGTH:
+                        return True
+                offset += length
+    except OSError:
+        return False
+    return offset == file_size and file_size > DicomConstants.PREAMBLE_LENGTH.value + \
+        len(DicomConstants.MAGIC.value)
+
+
+def iter_directory(directory, recursive=False, detect_dicom=False, output_prefix=""):
+    """iter_directory
+    Yield DICOM files of a directory while it is walked, in the order the
+    file system lists them. Files of sub-directories are named after their
+    path relative to the walked directory, like 'series1_IM00001', since
+    archives often reuse names like 'IM00001' in each series directory
+
+    Arguments:
+        directory {str} -- Directory location
+
+    Keyword Arguments:
+        recursive {bool} -- Walk sub-directories (default: {False})
+        detect_dicom {bool} -- Also yield files without the '.dcm' suffix
+            which start with the DICOM magic (default: {False})
+        output_prefix {str} -- Prefix of the output names of the files
+            (default: {""})
+
+    Yields:
+        tuple -- DICOM file location and its output name
+    """
+    try:
+        directory_entries = os.scandir(directory)
+    except PermissionError as error:
+        logger.warning("Cannot read directory '%s': %s", directory, error)
+        return
+
+    with directory_entries:
+        for entry in directory_entries:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    yield from iter_directory(
+                        entry.path, recursive, detect_dicom,
+                        output_prefix + entry.name + OUTPUT_NAME_SEPARATOR)
+            elif entry.is_file():
+                if entry.name.endswith(DicomConstants.SUFFIX.value) or (
+                        detect_dicom and has_dicom_magic(entry.path)):
+                    input_file = Path(entry.path)
+                    yield input_file, output_prefix + input_file.stem
+
+
+def iter_input_files(input_filepaths, recursive=False, detect_dicom=False):
+    """iter_input_files
+    Yield DICOM files given as arguments and DICOM files available in
+    directories given as arguments
+
+    Arguments:
+        input_filepaths {list} -- Files and directories locations
+
+    Keyword Arguments:
+        recursive {bool} -- Walk sub-directories (default: {False})
+        detect_dicom {bool} -- Also yield files without the '.dcm' suffix
+            which start with the DICOM magic (default: {False})
+
+    Yields:
+        tuple -- DICOM file location and its output name
+    """
+    for input_filepath in input_filepaths:
+        if input_filepath.is_dir():
+            yield from iter_directory(str(input_filepath), recursive, detect_dicom)
+        else:
+            yield input_filepath, input_filepath.stem
+
+
+def unique_output_names(input_files):
+    """unique_output_names
+    Yield DICOM files with the name of their output files. A name already
+    used by a previous file gets a number, like 'IM00001_2', so an output
+    file never overwrites the output of another file
+
+    Arguments:
+        input_files {iterable} -- DICOM files locations, or DICOM files
+            locations and output names yielded by iter_input_files. Files
+            without output name are named after their name without suffix
+
+    Yields:
+        tuple -- DICOM file location and its unique output name
+    """
+    used_output_names = set()
+    for input_file in input_files:
+        if isinstance(input_file, tuple):
+            input_file, output_name = input_file
+            input_file = Path(input_file)
+        else:
+            input_file = Path(input_file)
+            output_name = input_file.stem
+        unique_output_name = output_name
+        number = 1
+        while unique_output_name in used_output_names:
+            number += 1
+            unique_output_name = "{}{}{}".format(output_name, OUTPUT_NAME_SEPARATOR, number)
+        if unique_output_name != output_name:
+            logger.warning("%s is converted to '%s' files, '%s' is already used",
+                           input_file, unique_output_name, output_name)
+        used_output_names.add(unique_output_name)
+        yield input_file, unique_output_name
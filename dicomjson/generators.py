@@ -0,0 +1,299 @@
+"""generators
+Expand a json2dicom input object holding a 'generate' specification into
+as many objects as requested, each with its own generated DICOM values
+"""
+
+from dataclasses import dataclass
+import datetime
+import random
+from pydicom.uid import PYDICOM_ROOT_UID, generate_uid
+from constants import GeneratorType, JsonConstants
+from validation import STRING_VRS
+
+DATE_FORMAT = "%Y%m%d"
+# Errors raised by str.format for a format string which does not fit its values
+FORMAT_ERRORS = (AttributeError, IndexError, KeyError, TypeError, ValueError)
+# SOPInstanceUID, names the output file of an object without 'output'
+SOP_INSTANCE_UID_TAG = "00080018"
+# Generators whose values differ for each object index
+DISTINCT_GENERATOR_TYPES = (GeneratorType.SEQUENCE, GeneratorType.UID)
+
+
+@dataclass
+class InvalidGeneratedObject:
+    """Class for keeping track of an input object whose 'generate'
+    specification cannot be expanded. It takes the place of the generated
+    objects, so it fails like an invalid object when it is converted"""
+    input_json: dict
+    error: ValueError
+
+
+@dataclass
+class FieldGenerator:
+    """Class for generating the value of a DICOM field"""
+    tag: str
+    vr: str
+    generator_type: GeneratorType
+    parameters: object
+
+    def value(self, index, rng, seed):
+        """value
+        Generate the value of the field for an object
+
+        Arguments:
+            index {int} -- Object index in the expansion
+            rng {random.Random} -- Random generator of the object
+            seed {object} -- Seed of the specification, None for random values
+
+        Returns:
+            object -- Field value
+        """
+        parameters = self.parameters
+        if self.generator_type == GeneratorType.CHOICE:
+            return rng.choice(parameters)
+        if self.generator_type == GeneratorType.UID:
+            prefix = parameters.get("prefix", PYDICOM_ROOT_UID)
+            # A seeded specification gives the same UID for an object index
+            entropy_sources = None if seed is None else [
+                str(seed), str(index), self.tag]
+            return generate_uid(prefix, entropy_sources)
+        if self.generator_type == GeneratorType.DATE:
+            start = datetime.datetime.strptime(parameters["start"], DATE_FORMAT).date()
+            end = datetime.datetime.strptime(parameters["end"], DATE_FORMAT).date()
+            return (start + datetime.timedelta(
+                days=rng.randint(0, (end - start).days))).strftime(DATE_FORMAT)
+        if self.generator_type == GeneratorType.SEQUENCE:
+            value = parameters.get("start", 0) + index * parameters.get("step", 1)
+        else:
+            minimum, maximum = parameters["min"], parameters["max"]
+            if isinstance(minimum, int) and isinstance(maximum, int):
+                value = rng.randint(minimum, maximum)
+            else:
+                value = rng.uniform(minimum, maximum)
+        if "format" in parameters:
+            return format_value(self.tag, parameters["format"], value)
+        return value
+
+    def to_json_dict(self, index, rng, seed):
+        """to_json_dict
+        Describe the generated field as DICOM JSON
+
+        Arguments:
+            index {int} -- Object index in the expansion
+            rng {random.Random} -- Random generator of the object
+            seed {object} -- Seed of the specification, None for random values
+
+        Returns:
+            dict -- DICOM JSON field
+        """
+        value = self.value(index, rng, seed)
+        if self.vr in STRING_VRS or self.vr == "PN":
+            # Numbers generated without 'format' are written as text
+            value = str(value)
+        if self.vr == "PN":
+            value = {"Alphabetic": value}
+        return {"vr": self.vr, "Value": [value]}
+
+
+def format_value(tag, value_format, value):
+    """format_value
+    Format a generated value
+
+    Arguments:
+        tag {str} -- DICOM tag written as 8 hexadecimal characters
+        value_format {str} -- Format string, like "PAT{:06d}"
+        value {object} -- Generated value
+
+    Raises:
+        ValueError: The format string does not fit the value
+
+    Returns:
+        str -- Formatted value
+    """
+    try:
+        return value_format.format(value)
+    except FORMAT_ERRORS as error:
+        format_error = "'{}' generated field cannot format {!r} with '{}': {}".format(
+            tag, value, value_format, error)
+        raise ValueError(format_error) from error
+
+
+def format_output_filename(output_filename, index):
+    """format_output_filename
+    Format the output file name of a generated object
+
+    Arguments:
+        output_filename {str} -- Format string, like "study_{index:06d}.dcm"
+        index {int} -- Object index in the expansion
+
+    Raises:
+        ValueError: The format string does not fit the index
+
+    Returns:
+        str -- Output file name
+    """
+    try:
+        return output_filename.format(index=index)
+    except FORMAT_ERRORS as error:
+        output_error = "'{}' output cannot be formatted with the object index: {}".format(
+            output_filename, error)
+        raise ValueError(output_error) from error
+
+
+def compile_field_generator(tag, field_spec):
+    """compile_field_generator
+    Check a field specification, like {"vr": "LO", "sequence": {"start": 1}}
+
+    Arguments:
+        tag {str} -- DICOM tag written as 8 hexadecimal characters
+        field_spec {dict} -- Field specification
+
+    Raises:
+        ValueError: Invalid field specification
+
+    Returns:
+        FieldGenerator -- Field generator
+    """
+    generator_types = [generator_type for generator_type in GeneratorType
+                       if isinstance(field_spec, dict) and generator_type.value in field_spec]
+    if not isinstance(field_spec, dict) or "vr" not in field_spec or len(generator_types) != 1:
+        field_error = "'{}' generated field needs a 'vr' and one generator among {}".format(
+            tag, [generator_type.value for generator_type in GeneratorType])
+        raise ValueError(field_error)
+    generator_type = generator_types[0]
+    parameters = field_spec[generator_type.value]
+    if generator_type == GeneratorType.CHOICE:
+        is_valid = isinstance(parameters, list) and len(parameters) > 0
+    elif generator_type == GeneratorType.DATE:
+        try:
+            is_valid = datetime.datetime.strptime(parameters["start"], DATE_FORMAT) <= \
+                datetime.datetime.strptime(parameters["end"], DATE_FORMAT)
+        except (KeyError, TypeError, ValueError):
+            is_valid = False
+    elif generator_type == GeneratorType.RANGE:
+        is_valid = isinstance(parameters, dict) and "min" in parameters and \
+            "max" in parameters and parameters["min"] <= parameters["max"]
+    elif generator_type == GeneratorType.UID:
+        try:
+            # pydicom checks the prefix while generating a UID
+            is_valid = isinstance(parameters, dict) and bool(generate_uid(
+                parameters.get("prefix", PYDICOM_ROOT_UID), [tag]))
+        except (TypeError, ValueError):
+            is_valid = False
+    else:
+        is_valid = isinstance(parameters, dict)
+    if not is_valid:
+        parameters_error = "'{}' generated field has invalid '{}' parameters: {}".format(
+            tag, generator_type.value, parameters)
+        raise ValueError(parameters_error)
+    if generator_type in (GeneratorType.RANGE, GeneratorType.SEQUENCE) and \
+            "format" in parameters:
+        # Checked on the first values, before any object is generated
+        if generator_type == GeneratorType.RANGE:
+            values = (parameters["min"], parameters["max"])
+        else:
+            values = (parameters.get("start", 0),
+                      parameters.get("start", 0) + parameters.get("step", 1))
+        for value in values:
+            format_value(tag, parameters["format"], value)
+    return FieldGenerator(tag, field_spec["vr"], generator_type, parameters)
+
+
+def expand_json_object(input_json):
+    """expand_json_object
+    Expand an input object holding a 'generate' specification:
+        "generate": {
+            "count": 1000,
+            "seed": 42,
+            "fields": {"00100020": {"vr": "LO", "sequence": {"start": 1, "format": "PAT{:06d}"}}}
+        }
+    Each object gets the template and image of the input object, its
+    'data' updated with the generated fields, and its 'output' formatted
+    with the object index, like "study_{index:06d}.dcm". Objects must not
+    overwrite each other: with a count above 1, 'output' needs the
+    object index, or without 'output', SOPInstanceUID needs a 'uid' or
+    'sequence' generator
+
+    Arguments:
+        input_json {dict} -- Input object with a 'generate' specification
+
+    Raises:
+        ValueError: Invalid specification, raised before the first object
+
+    Yields:
+        dict -- Generated input object, InvalidGeneratedObject when a value
+            of the object cannot be formatted
+    """
+    spec = input_json[JsonConstants.GENERATE.value]
+    count = spec.get(JsonConstants.COUNT.value) if isinstance(spec, dict) else None
+    if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+        count_error = "'{}' specification needs a positive '{}', abort json2dicom execution!".format(
+            JsonConstants.GENERATE.value, JsonConstants.COUNT.value)
+        raise ValueError(count_error)
+    seed = spec.get(JsonConstants.SEED.value)
+    field_generators = [compile_field_generator(tag, field_spec)
+                        for tag, field_spec in spec.get(JsonConstants.FIELDS.value, {}).items()]
+
+    base_json = {key: value for key, value in input_json.items()
+                 if key != JsonConstants.GENERATE.value}
+    base_data = base_json.get(JsonConstants.DATA.value, {})
+    output_filename = base_json.get(JsonConstants.OUTPUT.value)
+    if output_filename:
+        is_distinct = format_output_filename(output_filename, 0) != \
+            format_output_filename(output_filename, 1)
+    else:
+        is_distinct = any(field_generator.tag.upper() == SOP_INSTANCE_UID_TAG
+                          and field_generator.generator_type in DISTINCT_GENERATOR_TYPES
+                          for field_generator in field_generators)
+    if count > 1 and not is_distinct:
+        output_error = "'{}' objects would be written to the same file, '{}' needs an '{{index}}' field, or a 'uid' or 'sequence' generator of {} without '{}'".format(
+            JsonConstants.GENERATE.value, JsonConstants.OUTPUT.value,
+            SOP_INSTANCE_UID_TAG, JsonConstants.OUTPUT.value)
+        raise ValueError(output_error)
+    for index in range(count):
+        # Values of an object only depend on the seed and the object index
+        rng = random.Random() if seed is None else random.Random(
+            "{}:{}".format(seed, index))
+        generated_json = dict(base_json)
+        generated_json[JsonConstants.DATA.value] = dict(base_data)
+        try:
+            for field_generator in field_generators:
+                generated_json[JsonConstants.DATA.value][field_generator.tag] = \
+                    field_generator.to_json_dict(index, rng, seed)
+            if output_filename:
+                generated_json[JsonConstants.OUTPUT.value] = format_output_filename(
+                    output_filename, index)
+        except ValueError as error:
+            yield InvalidGeneratedObject(input_json, error)
+            continue
+        yield generated_json
+
+
+def expand_json_objects(json_objects):
+    """expand_json_objects
+    Expand lazily the input objects holding a 'generate' specification,
+    other objects are yielded unchanged. An invalid specification is
+    yielded once as an InvalidGeneratedObject, so the conversion reports
+    it like any invalid object, and the following objects are still
+    converted with --keep-going
+
+    Arguments:
+        json_objects {iterable} -- Input objects
+
+    Yields:
+        dict -- Input object, or InvalidGeneratedObject
+    """
+    for input_json in json_objects:
+        if isinstance(input_json, dict) and JsonConstants.GENERATE.value in input_json:
+            try:
+                # Checked before the first object, so a specification
+                # fails as a whole or for a single object
+                generated_objects = expand_json_object(input_json)
+                first_object = next(generated_objects)
+            except ValueError as error:
+                yield InvalidGeneratedObject(input_json, error)
+                continue
+            yield first_object
+            yield from generated_objects
+        else:
+            yield input_json
@@ -0,0 +1,584 @@
+"""image_io
+Read and write images extracted from the DICOM PixelData field.
+OpenCV and NumPy are imported by the functions using them, so runs which
+do not handle images do not pay for their import
+"""
+
+from dataclasses import dataclass
+import logging
+import os
+from pathlib import Path
+import struct
+from pydicom import dcmread
+from pydicom.filereader import read_dataset
+from pydicom.uid import DeflatedExplicitVRLittleEndian
+from constants import ImageFormat, NpyConstants, PngConstants, PngFilter, PngStrategy, \
+    RawConstants
+
+PIXEL_DATA_TAG = 0x7FE00010
+# Explicit VR whose length is written on 4 bytes, after 2 reserved bytes
+LONG_LENGTH_VRS = frozenset(("OB", "OD", "OF", "OL", "OV", "OW", "SQ", "SV",
+                             "UC", "UN", "UR", "UT", "UV"))
+UNDEFINED_LENGTH = 0xFFFFFFFF
+SEQUENCE_DELIMITER_TAG = 0xFFFEE0DD
+# OpenCV flags of PNG strategies and filters
+PNG_STRATEGY_FLAGS = {
+    PngStrategy.DEFAULT: "IMWRITE_PNG_STRATEGY_DEFAULT",
+    PngStrategy.FILTERED: "IMWRITE_PNG_STRATEGY_FILTERED",
+    PngStrategy.FIXED: "IMWRITE_PNG_STRATEGY_FIXED",
+    PngStrategy.HUFFMAN_ONLY: "IMWRITE_PNG_STRATEGY_HUFFMAN_ONLY",
+    PngStrategy.RLE: "IMWRITE_PNG_STRATEGY_RLE",
+}
+PNG_FILTER_FLAGS = {
+    PngFilter.ALL: "IMWRITE_PNG_ALL_FILTERS",
+    PngFilter.AVG: "IMWRITE_PNG_FILTER_AVG",
+    PngFilter.FAST: "IMWRITE_PNG_FAST_FILTERS",
+    PngFilter.NONE: "IMWRITE_PNG_FILTER_NONE",
+    PngFilter.PAETH: "IMWRITE_PNG_FILTER_PAETH",
+    PngFilter.SUB: "IMWRITE_PNG_FILTER_SUB",
+    PngFilter.UP: "IMWRITE_PNG_FILTER_UP",
+}
+
+logger = logging.getLogger('root')
+
+
+@dataclass
+class PixelDataLocation:
+    """Class for keeping track of the PixelData value position in a file"""
+    offset: int
+    length: int
+    vr: str
+
+
+@dataclass(frozen=True)
+class PngOptions:
+    """Class for keeping track of PNG encoder settings, None keeps the
+    OpenCV default"""
+    compression_level: int = None
+    strategy: PngStrategy = None
+    png_filter: PngFilter = None
+
+    def imwrite_params(self):
+        """imwrite_params
+        Convert the settings to cv2.imwrite parameters. The filter is
+        ignored by OpenCV versions which cannot choose it
+
+        Raises:
+            ValueError: Compression level out of the 0-9 range
+
+        Returns:
+            list -- Flags followed by their value
+        """
+        import cv2  # pylint: disable=import-outside-toplevel
+        params = []
+        if self.compression_level is not None:
+            if not 0 <= self.compression_level <= 9:
+                compression_level_error = "PNG compression level must be between 0 and 9, not '{}'".format(
+                    self.compression_level)
+                raise ValueError(compression_level_error)
+            # Written first, OpenCV resets the strategy when reading it
+            params += [cv2.IMWRITE_PNG_COMPRESSION, self.compression_level]
+        if self.strategy is not None:
+            params += [cv2.IMWRITE_PNG_STRATEGY,
+                       getattr(cv2, PNG_STRATEGY_FLAGS[self.strategy])]
+        if self.png_filter is not None and hasattr(cv2, "IMWRITE_PNG_FILTER"):
+            params += [cv2.IMWRITE_PNG_FILTER,
+                       getattr(cv2, PNG_FILTER_FLAGS[self.png_filter])]
+        return params
+
+
+# Named PNG encoder settings. 'fast' trades a little compression for
+# encoding throughput, see benchmarks/bench_png.py
+PNG_PRESETS = {
+    "default": PngOptions(),
+    "fast": PngOptions(1, PngStrategy.HUFFMAN_ONLY, PngFilter.UP),
+}
+
+
+def read_pixel_data_header(dicom_file, dicom_dataset):
+    """read_pixel_data_header
+    Read the header of the PixelData element following a dataset read
+    with stop_before_pixels. Another element is left unread
+
+    Arguments:
+        dicom_file {file} -- DICOM file, positioned after the dataset
+        dicom_dataset {Dataset} -- Dataset read until PixelData
+
+    Returns:
+        PixelDataLocation -- PixelData value position, its length is
+            UNDEFINED_LENGTH for encapsulated pixel data. None if the
+            dataset is not followed by PixelData
+    """
+    endian = "<" if dicom_dataset.is_little_endian else ">"
+    header = dicom_file.read(8)
+    if len(header) < 8:
+        dicom_file.seek(-len(header), os.SEEK_CUR)
+        return None
+    group, element = struct.unpack(endian + "HH", header[:4])
+    if (group << 16 | element) != PIXEL_DATA_TAG:
+        dicom_file.seek(-len(header), os.SEEK_CUR)
+        return None
+
+    if dicom_dataset.is_implicit_VR:
+        vr = "OW" if (dicom_dataset.get("BitsAllocated") or 8) > 8 else "OB"
+        length = struct.unpack(endian + "L", header[4:8])[0]
+    else:
+        vr = header[4:6].decode("ascii")
+        if vr in LONG_LENGTH_VRS:
+            length = struct.unpack(endian + "L", dicom_file.read(4))[0]
+        else:
+            length = struct.unpack(endian + "H", header[6:8])[0]
+    return PixelDataLocation(dicom_file.tell(), length, vr)
+
+
+def skip_encapsulated_pixel_data(dicom_file, is_little_endian):
+    """skip_encapsulated_pixel_data
+    Move past the items of an encapsulated PixelData value, up to and
+    including its sequence delimiter
+
+    Arguments:
+        dicom_file {file} -- DICOM file, positioned on the first item
+        is_little_endian {bool} -- Byte order of the dataset
+
+    Raises:
+        EOFError: The sequence delimiter is missing
+    """
+    endian = "<" if is_little_endian else ">"
+    while True:
+        header = dicom_file.read(8)
+        if len(header) < 8:
+            raise EOFError("Encapsulated PixelData has no sequence delimiter")
+        group, element, length = struct.unpack(endian + "HHL", header)
+        if (group << 16 | element) == SEQUENCE_DELIMITER_TAG:
+            return
+        dicom_file.seek(length, os.SEEK_CUR)
+
+
+def read_dataset_without_pixel_data(dicom_file):
+    """read_dataset_without_pixel_data
+    Read a DICOM file without loading its PixelData value. The dataset is
+    read until PixelData, then the PixelData value is skipped and the
+    fields stored after it are read.
+    A deflated file cannot be read past PixelData without inflating it, so
+    the whole file is read and PixelData is loaded in the dataset
+
+    Arguments:
+        dicom_file {file} -- Seekable binary DICOM file
+
+    Returns:
+        tuple -- Dataset and PixelDataLocation, None if there is no
+            PixelData or if its value is loaded in the dataset
+    """
+    start = dicom_file.tell()
+    dicom_dataset = dcmread(dicom_file, stop_before_pixels=True)
+    # Checked before anything is read after the dataset, pydicom has
+    # already inflated the whole file
+    if dicom_dataset.file_meta.get("TransferSyntaxUID") == DeflatedExplicitVRLittleEndian:
+        dicom_file.seek(start)
+        return dcmread(dicom_file), None
+
+    pixel_data_location = read_pixel_data_header(dicom_file, dicom_dataset)
+    if pixel_data_location is not None:
+        if pixel_data_location.length == UNDEFINED_LENGTH:
+            skip_encapsulated_pixel_data(dicom_file, dicom_dataset.is_little_endian)
+        else:
+            dicom_file.seek(pixel_data_location.offset + pixel_data_location.length)
+    dicom_dataset.update(read_dataset(
+        dicom_file, dicom_dataset.is_implicit_VR, dicom_dataset.is_little_endian))
+    return dicom_dataset, pixel_data_location
+
+
+def read_dataset_and_locate_pixel_data(input_file):
+    """read_dataset_and_locate_pixel_data
+    Read a DICOM file without loading its PixelData value, see
+    read_dataset_without_pixel_data.
+    When PixelData cannot be mapped (encapsulated or deflated transfer
+    syntaxes), the whole file is read
+
+    Arguments:
+        input_file {Path} -- DICOM file location
+
+    Returns:
+        tuple -- Dataset and PixelDataLocation, None if the PixelData
+            value is loaded in the dataset or if there is no PixelData
+    """
+    with open(str(input_file), "rb") as dicom_file:
+        dicom_dataset, pixel_data_location = read_dataset_without_pixel_data(dicom_file)
+        if pixel_data_location is not None and \
+                pixel_data_location.length == UNDEFINED_LENGTH:
+            dicom_file.seek(0)
+            return dcmread(dicom_file), None
+    return dicom_dataset, pixel_data_location
+
+
+def frames_memmap(input_file, pixel_data_location, rows, columns,
+                  number_of_frames, bits_allocated):
+    """frames_memmap
+    Map the PixelData value of a file to an array of frames, the pixels
+    are only read from the file when they are used
+
+    Arguments:
+        input_file {Path} -- DICOM file location
+        pixel_data_location {PixelDataLocation} -- PixelData value position
+        rows {int} -- Number of rows
+        columns {int} -- Number of columns
+        number_of_frames {int} -- Number of frames
+        bits_allocated {int} -- Number of bits allocated for each pixel
+
+    Returns:
+        np.memmap -- Read-only array of shape (frames, rows, columns)
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    return np.memmap(str(input_file),
+                     dtype=pixel_dtype(bits_allocated),
+                     mode="r",
+                     offset=pixel_data_location.offset,
+                     shape=(number_of_frames, rows, columns))
+
+
+def pixel_dtype(bits_allocated):
+    """pixel_dtype
+    Find the NumPy type of a pixel
+
+    Arguments:
+        bits_allocated {int} -- Number of bits allocated for each pixel
+
+    Raises:
+        ValueError: Unmanaged number of bits
+
+    Returns:
+        type -- NumPy type
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    if bits_allocated == 8:
+        return np.uint8
+    if bits_allocated == 16:
+        return np.uint16
+    bits_allocated_error = "Unrecognized DICOM BitsStored value '{}'".format(
+        bits_allocated)
+    raise ValueError(bits_allocated_error)
+
+
+def expected_pixel_data_length(rows, columns, number_of_frames, bits_allocated):
+    """expected_pixel_data_length
+    Compute the length of uncompressed pixel data, without padding
+
+    Arguments:
+        rows {int} -- Number of rows
+        columns {int} -- Number of columns
+        number_of_frames {int} -- Number of frames
+        bits_allocated {int} -- Number of bits allocated for each pixel
+
+    Returns:
+        int -- Length in bytes
+    """
+    return int(number_of_frames * rows * columns * (bits_allocated / 8))
+
+
+def is_pixel_data_length_valid(pixel_data_length, expected_length):
+    """is_pixel_data_length_valid
+    Check pixel data length, an odd length is padded with one byte
+
+    Arguments:
+        pixel_data_length {int} -- Length of PixelData value
+        expected_length {int} -- Length computed from image dimensions
+
+    Returns:
+        bool -- True if the lengths are consistent
+    """
+    return pixel_data_length in (expected_length, expected_length + expected_length % 2)
+
+
+def frames_view(pixel_data, rows, columns, number_of_frames, bits_allocated):
+    """frames_view
+    Create an array of frames over pixel data, without copying it
+
+    Arguments:
+        pixel_data {bytes} -- Uncompressed pixel data
+        rows {int} -- Number of rows
+        columns {int} -- Number of columns
+        number_of_frames {int} -- Number of frames
+        bits_allocated {int} -- Number of bits allocated for each pixel
+
+    Returns:
+        np.ndarray -- Array of shape (frames, rows, columns)
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    return np.ndarray((number_of_frames, rows, columns),
+                      pixel_dtype(bits_allocated),
+                      pixel_data)
+
+
+def write_image(frames, output_filepath, image_format=ImageFormat.PNG,
+                png_options=None):
+    """write_image
+    Write frames to image files. With the PNG format, a single frame is
+    written to '<name>.png' and several frames to numbered '<name>_0000.png'
+    files, one frame at a time. With the NPY format, every frame is written
+    to a single '<name>.npy' array. With the RAW format, the pixel bytes
+    are written as is to '<name>.raw', without any header
+
+    Arguments:
+        frames {np.ndarray} -- Array of shape (frames, rows, columns)
+        output_filepath {Path} -- Output filepath without suffix
+
+    Keyword Arguments:
+        image_format {ImageFormat} -- Image file format (default: {ImageFormat.PNG})
+        png_options {PngOptions} -- PNG encoder settings (default: {None},
+            OpenCV defaults)
+
+    Returns:
+        str or list -- Image filepath, or image filepaths for numbered PNG files
+    """
+    if image_format == ImageFormat.NPY:
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        output_image_filepath = output_filepath.with_suffix(
+            NpyConstants.SUFFIX.value)
+        np.save(str(output_image_filepath),
+                frames[0] if len(frames) == 1 else frames)
+        return str(output_image_filepath)
+
+    if image_format == ImageFormat.RAW:
+        output_image_filepath = output_filepath.with_suffix(
+            RawConstants.SUFFIX.value)
+        frames.astype(frames.dtype.newbyteorder("<"), copy=False).tofile(
+            str(output_image_filepath))
+        return str(output_image_filepath)
+
+    import cv2  # pylint: disable=import-outside-toplevel
+    params = png_options.imwrite_params() if png_options else []
+    if len(frames) == 1:
+        output_image_filepath = output_filepath.with_suffix(
+            PngConstants.SUFFIX.value)
+        cv2.imwrite(str(output_image_filepath),
+                    frames[0], params)  # pylint: disable=E1101
+        return str(output_image_filepath)
+
+    output_image_filepaths = []
+    for index, frame in enumerate(frames):
+        output_image_filepath = output_filepath.parent / "{}_{:04d}{}".format(
+            output_filepath.name, index, PngConstants.SUFFIX.value)
+        cv2.imwrite(str(output_image_filepath),
+                    frame, params)  # pylint: disable=E1101
+        output_image_filepaths.append(str(output_image_filepath))
+    return output_image_filepaths
+
+
+def check_image_file(image_filepath):
+    """check_image_file
+    Check that an image file exists
+
+    Arguments:
+        image_filepath {Path} -- Image file location
+
+    Raises:
+        ValueError: Missing image file
+    """
+    if not image_filepath.exists():
+        image_not_exists = "'{}' image file does not exists, abort json2dicom execution!".format(
+            image_filepath)
+        raise ValueError(image_not_exists)
+    if not image_filepath.is_file():
+        image_is_not_file = "'{}' image is not a file, abort json2dicom execution!".format(
+            image_filepath)
+        raise ValueError(image_is_not_file)
+
+
+def read_png(image_filepath):
+    """read_png
+    Read a grayscale PNG file
+
+    Arguments:
+        image_filepath {Path} -- PNG file location
+
+    Raises:
+        ValueError: Invalid image file
+
+    Returns:
+        np.ndarray -- Array of shape (rows, columns)
+    """
+    import cv2  # pylint: disable=import-outside-toplevel
+    check_image_file(image_filepath)
+
+    image = cv2.imread(str(image_filepath),
+                       flags=cv2.IMREAD_UNCHANGED)
+    if len(image.shape) >= 3:
+        raise ValueError(
+            "Cannot manage image with bit depth > 16 bits")
+    return image
+
+
+def read_npy(image_filepath):
+    """read_npy
+    Map a NumPy array file in memory, pixels are read only when used
+
+    Arguments:
+        image_filepath {Path} -- NPY file location
+
+    Raises:
+        ValueError: Invalid image file
+
+    Returns:
+        np.ndarray -- Read-only array of shape (rows, columns) or
+            (frames, rows, columns)
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    check_image_file(image_filepath)
+    image = np.load(str(image_filepath), mmap_mode="r", allow_pickle=False)
+    if image.ndim not in (2, 3) or image.dtype.itemsize not in (1, 2) or \
+            image.dtype.kind != "u":
+        image_error = "'{}' image must be an array of 2 or 3 dimensions of 8 or 16 bits unsigned integers".format(
+            image_filepath)
+        raise ValueError(image_error)
+    return image
+
+
+def read_raw(image_filepath, dicom_dataset):
+    """read_raw
+    Map a raw pixel data file in memory. The file has no header, its
+    dimensions are given by the Rows, Columns, NumberOfFrames and
+    BitsAllocated fields of the dataset
+
+    Arguments:
+        image_filepath {Path} -- Raw file location
+        dicom_dataset {Dataset} -- Dataset describing the pixels
+
+    Raises:
+        ValueError: Invalid image file
+
+    Returns:
+        np.memmap -- Read-only array of shape (rows, columns) or
+            (frames, rows, columns)
+    """
+    check_image_file(image_filepath)
+    for keyword in ("Rows", "Columns", "BitsAllocated"):
+        if keyword not in dicom_dataset:
+            dimension_error = "Cannot read '{}' raw image without the '{}' DICOM field".format(
+                image_filepath, keyword)
+            raise ValueError(dimension_error)
+    rows = dicom_dataset.Rows
+    columns = dicom_dataset.Columns
+    bits_allocated = dicom_dataset.BitsAllocated
+    number_of_frames = int(dicom_dataset.get("NumberOfFrames") or 1)
+    expected_length = expected_pixel_data_length(
+        rows, columns, number_of_frames, bits_allocated)
+    if image_filepath.stat().st_size != expected_length:
+        length_error = "'{}' raw image length is not consistent with {} frame(s) of {}x{} pixels of {} bits".format(
+            image_filepath, number_of_frames, rows, columns, bits_allocated)
+        raise ValueError(length_error)
+    shape = (rows, columns) if number_of_frames == 1 else \
+        (number_of_frames, rows, columns)
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    return np.memmap(str(image_filepath),
+                     dtype=np.dtype(pixel_dtype(bits_allocated)).newbyteorder("<"),
+                     mode="r",
+                     shape=shape)
+
+
+def pixel_data_buffer(image):
+    """pixel_data_buffer
+    Give the bytes of an image as a PixelData value, without copying them
+    when the array is C-contiguous and little endian. Mapped arrays are
+    not read before the DICOM file is written
+
+    Arguments:
+        image {np.ndarray} -- Array of shape (rows, columns) or
+            (frames, rows, columns)
+
+    Returns:
+        memoryview -- Little endian pixel bytes, not padded
+    """
+    little_endian_dtype = image.dtype.newbyteorder("<")
+    if not image.flags.c_contiguous or image.dtype != little_endian_dtype:
+        logger.debug("Copy image of shape %s and type %s to a C-contiguous little endian array",
+                     image.shape, image.dtype.str)
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        image = np.ascontiguousarray(image, little_endian_dtype)
+    return memoryview(image).cast("B")
+
+
+def write_pixel_data(dicom_file, pixel_data, bits_allocated):
+    """write_pixel_data
+    Write a PixelData element in explicit VR little endian. The value is
+    written from its buffer, pydicom would copy it twice while encoding
+    the element, and an odd length value is followed by a padding byte
+
+    Arguments:
+        dicom_file {file} -- File opened in binary mode, after the last
+            element preceding PixelData
+        pixel_data {memoryview} -- Pixel bytes, not padded
+        bits_allocated {int} -- Number of bits allocated for each pixel
+    """
+    pixel_data_length = pixel_data.nbytes
+    padding = pixel_data_length % 2
+    vr = b"OW" if bits_allocated > 8 else b"OB"
+    dicom_file.write(struct.pack("<HH2sHL", PIXEL_DATA_TAG >> 16, PIXEL_DATA_TAG & 0xFFFF,
+                                 vr, 0, pixel_data_length + padding))
+    dicom_file.write(pixel_data)
+    if padding:
+        dicom_file.write(b"\0")
+
+
+def image_format_from_suffix(image_filepath):
+    """image_format_from_suffix
+    Find the format of an image file from its suffix
+
+    Arguments:
+        image_filepath {Path} -- Image file location
+
+    Returns:
+        ImageFormat -- Image file format, PNG for unknown suffixes
+    """
+    suffix = image_filepath.suffix.lower()
+    if suffix == NpyConstants.SUFFIX.value:
+        return ImageFormat.NPY
+    if suffix == RawConstants.SUFFIX.value:
+        return ImageFormat.RAW
+    return ImageFormat.PNG
+
+
+def read_image(image_json_data, image_format=None, dicom_dataset=None):
+    """read_image
+    Read the image of a json2dicom input object. NPY and RAW files are
+    mapped in memory instead of being decoded
+
+    Arguments:
+        image_json_data {str or list} -- Image filepath, or PNG filepaths
+            of each frame
+
+    Keyword Arguments:
+        image_format {ImageFormat} -- Image file format, found from the file
+            suffix when None (default: {None})
+        dicom_dataset {Dataset} -- Dataset giving the dimensions of a RAW
+            image (default: {None})
+
+    Raises:
+        ValueError: Invalid image file
+
+    Returns:
+        np.ndarray -- Array of shape (rows, columns), or
+            (frames, rows, columns) for several frames
+    """
+    if isinstance(image_json_data, list):
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        first_frame = read_png(Path(image_json_data[0]))
+        frames = np.empty((len(image_json_data),) + first_frame.shape,
+                          first_frame.dtype)
+        frames[0] = first_frame
+        for index, frame_json_data in enumerate(image_json_data[1:], 1):
+            frame = read_png(Path(frame_json_data))
+            if frame.shape != first_frame.shape or frame.dtype != first_frame.dtype:
+                frame_error = "'{}' frame is not consistent with the first frame, abort json2dicom execution!".format(
+                    frame_json_data)
+                raise ValueError(frame_error)
+            frames[index] = frame
+        return frames
+
+    image_filepath = Path(image_json_data)
+    if image_format is None:
+        image_format = image_format_from_suffix(image_filepath)
+    if image_format == ImageFormat.NPY:
+        return read_npy(image_filepath)
+    if image_format == ImageFormat.RAW:
+        return read_raw(image_filepath, dicom_dataset)
+    return read_png(image_filepath)
@@ -1,41 +1,306 @@
 #!/usr/bin/env python3
 
 import argparse
-import json
+from collections import OrderedDict
+from contextlib import ExitStack
+import copy
+from dataclasses import dataclass
+from functools import partial
+import multiprocessing
+import os
 from pathlib import Path
 import logging
-from logging import config
-import yaml
-import cv2
-from pydicom.dataset import Dataset, FileDataset
-from constants import DicomConstants, JsonConstants, PngConstants
+from pydicom.dataset import Dataset
+from constants import DicomConstants, ImageFormat, JsonConstants, Stage
+from conversion import load_dataset, override_dataset, parse_dataset, set_image, write_dicom
+from discovery import is_complete_dicom_file
+from generators import InvalidGeneratedObject, expand_json_objects
+from image_io import image_format_from_suffix, read_image
+from json_backend import get_json_backend
+from logging_setup import (add_logging_arguments, configure_logging, init_worker_logging,
+                           worker_log_queue)
+from manifest import (ConvertedObject, FailedObject, JsonLinesManifestWriter, read_failed_indices,
+                      read_json_objects)
+from metrics import add_metrics_arguments, metrics_from_args
+from prefetch import BoundedPrefetch, prefetch_limit
+from timing import FileTimings, RunSummary, measure
 
 DEFAULT_OUTPUT_DIR = Path(__file__).parent / Path("output")
+DEFAULT_ERROR_REPORT_FILEPATH = DEFAULT_OUTPUT_DIR / Path("_json2dicom_errors.jsonl")
+# Number of parsed templates kept in memory
+DEFAULT_TEMPLATE_CACHE_SIZE = 32
+# Number of decoded PNG images kept in memory
+DEFAULT_IMAGE_CACHE_SIZE = 4
+# Number of objects sent at once to a worker process
+DEFAULT_CHUNKSIZE = 8
 
-# Load logger configuration from YAML file
-with open(Path(__file__).parent / Path("logger_config.yaml"), 'rt') as f:
-    config_data = yaml.safe_load(f.read())
-    config.dictConfig(config_data)
 # Get basic logger
 logger = logging.getLogger('root')
 
 
-def convert_data_to_dicom(input_filepath, input_json):
+@dataclass
+class CachedTemplate:
+    """Class for keeping track of a parsed template file"""
+    mtime: int
+    size: int
+    dataset: Dataset
+    meta: Dataset
+
+
+@dataclass
+class CachedImage:
+    """Class for keeping track of a decoded image file"""
+    mtime: int
+    size: int
+    image: object
+
+
+# Parsed templates, indexed by template filepath. Each worker process
+# has its own cache
+template_cache = OrderedDict()
+# Decoded PNG images, indexed by image filepath
+image_cache = OrderedDict()
+
+
+def copy_dataset(dicom_dataset):
+    """
+    Copy a dataset without copying its values. Each data element is copied,
+    so setting a value on the copy never changes the original dataset
+
+    Args:
+        dicom_dataset (Dataset): Dataset to copy
+
+    Returns:
+        Dataset: Dataset copy
+    """
+    return Dataset({tag: copy.copy(data_element)
+                    for tag, data_element in dicom_dataset.items()})
+
+
+def load_template(input_filepath, template_filepath, json_backend=None, file_timings=None):
+    """
+    Parse a template file only once, until it is modified on disk, and
+    return a copy of its datasets
+
+    Args:
+        input_filepath (str): Input JSON file
+        template_filepath (Path): Template JSON file
+        json_backend (object, optional): JSON backend. Defaults to the
+            fastest available backend.
+        file_timings (FileTimings, optional): Timings of the object, the
+            template file is only read and parsed on a cache miss
+
+    Raises:
+        ValueError: Invalid value in the template file
+
+    Returns:
+        tuple: Dataset and file meta dataset copies
+    """
+    template_stat = template_filepath.stat()
+    template_key = str(template_filepath.absolute())
+    cached_template = template_cache.get(template_key)
+    if (cached_template is None
+            or cached_template.mtime != template_stat.st_mtime_ns
+            or cached_template.size != template_stat.st_size):
+        if json_backend is None:
+            json_backend = get_json_backend()
+        with measure(file_timings, Stage.READ):
+            with open(template_filepath, "rb") as template_file:
+                template_data = template_file.read()
+        if file_timings is not None:
+            file_timings.bytes_in += len(template_data)
+        with measure(file_timings, Stage.PARSE):
+            current_json = json_backend.loads(template_data)
+        dataset = load_dataset(input_filepath,
+                               current_json[JsonConstants.DATA.value],
+                               template_filepath.parent, file_timings)
+        with measure(file_timings, Stage.PARSE):
+            meta = parse_dataset(current_json[JsonConstants.META.value])
+        cached_template = CachedTemplate(
+            template_stat.st_mtime_ns, template_stat.st_size, dataset, meta)
+        template_cache[template_key] = cached_template
+        if len(template_cache) > DEFAULT_TEMPLATE_CACHE_SIZE:
+            template_cache.popitem(last=False)
+    template_cache.move_to_end(template_key)
+
+    with measure(file_timings, Stage.PARSE):
+        return copy_dataset(cached_template.dataset), copy_dataset(cached_template.meta)
+
+
+def image_files_size(image_json_data):
+    """
+    Compute the size of the image files of an object
+
+    Args:
+        image_json_data (str or list): Image filepath, or PNG filepaths of
+            each frame
+
+    Returns:
+        int: Size in bytes
+    """
+    image_filepaths = image_json_data if isinstance(image_json_data, list) \
+        else [image_json_data]
+    return sum(os.path.getsize(image_filepath) for image_filepath in image_filepaths)
+
+
+def load_image(image_json_data, image_format=None, dicom_dataset=None, file_timings=None):
+    """
+    Decode a PNG image file only once, until it is modified on disk. NPY
+    and RAW files are mapped in memory, so they are not cached
+
+    Args:
+        image_json_data (str or list): Image filepath, or PNG filepaths of
+            each frame
+        image_format (ImageFormat, optional): Format of the image file.
+            Defaults to the format given by the file suffix.
+        dicom_dataset (Dataset, optional): Dataset giving the dimensions
+            of a RAW image
+        file_timings (FileTimings, optional): Timings of the object, image
+            files are only counted as read on a cache miss
+
+    Raises:
+        ValueError: Invalid image file
+
+    Returns:
+        np.ndarray: Read-only image, shared by the objects using the file
+    """
+    if isinstance(image_json_data, list) or (image_format or image_format_from_suffix(
+            Path(image_json_data))) != ImageFormat.PNG:
+        image = read_image(image_json_data, image_format, dicom_dataset)
+        if file_timings is not None:
+            file_timings.bytes_in += image_files_size(image_json_data)
+        return image
+
+    image_filepath = Path(image_json_data)
+    image_key = str(image_filepath.absolute())
+    try:
+        image_stat = image_filepath.stat()
+    except OSError:
+        # read_image reports the missing file
+        return read_image(image_json_data, image_format, dicom_dataset)
+    cached_image = image_cache.get(image_key)
+    if (cached_image is None
+            or cached_image.mtime != image_stat.st_mtime_ns
+            or cached_image.size != image_stat.st_size):
+        image = read_image(image_json_data, image_format, dicom_dataset)
+        image.setflags(write=False)
+        if file_timings is not None:
+            file_timings.bytes_in += image_stat.st_size
+        cached_image = CachedImage(
+            image_stat.st_mtime_ns, image_stat.st_size, image)
+        image_cache[image_key] = cached_image
+        if len(image_cache) > DEFAULT_IMAGE_CACHE_SIZE:
+            image_cache.popitem(last=False)
+    image_cache.move_to_end(image_key)
+    return cached_image.image
+
+
+def write_dicom_file(dicom_dataset, dicom_meta, output_filepath, pixel_data=None,
+                     file_timings=None):
+    """
+    Write a DICOM file to a temporary file renamed once complete, so an
+    interrupted run never leaves a truncated file at output_filepath.
+    A worker killed while writing leaves the temporary file, see
+    remove_temporary_files
+
+    Args:
+        dicom_dataset (Dataset): Dataset to write, without PixelData when
+            pixel_data is given
+        dicom_meta (Dataset): File meta information
+        output_filepath (Path): DICOM file location
+        pixel_data (memoryview, optional): PixelData value written after
+            the dataset. Defaults to None.
+        file_timings (FileTimings, optional): Timings of the object.
+            Defaults to None.
+    """
+    temporary_filepath = output_filepath.with_name("{}.{}{}".format(
+        output_filepath.name, os.getpid(), DicomConstants.TEMPORARY_SUFFIX.value))
+    try:
+        with open(str(temporary_filepath), "wb") as dicom_file:
+            write_dicom(dicom_file, dicom_dataset, dicom_meta, pixel_data, file_timings)
+            if file_timings is not None:
+                file_timings.bytes_out += dicom_file.tell()
+        with measure(file_timings, Stage.WRITE):
+            os.replace(temporary_filepath, output_filepath)
+    except BaseException:
+        temporary_filepath.unlink(missing_ok=True)
+        raise
+
+
+def is_temporary_filename(filename):
+    """
+    Check if a file name is the name of a temporary DICOM file,
+    '<output name>.<process id>.part'
+
+    Args:
+        filename (str): File name
+
+    Returns:
+        bool: True for a temporary file
+    """
+    temporary_suffix = DicomConstants.TEMPORARY_SUFFIX.value
+    return filename.endswith(temporary_suffix) and \
+        filename[:-len(temporary_suffix)].rpartition(".")[2].isdigit()
+
+
+def remove_temporary_files(output_dir=DEFAULT_OUTPUT_DIR):
+    """
+    Remove the temporary DICOM files left by an interrupted run, like a
+    run whose workers were terminated after an error
+
+    Args:
+        output_dir (Path, optional): Directory walked with its
+            sub-directories. Defaults to 'output'.
+
+    Returns:
+        int: Number of removed files
+    """
+    removed_files = 0
+    for directory, _, filenames in os.walk(str(output_dir)):
+        for filename in filenames:
+            if is_temporary_filename(filename):
+                Path(directory, filename).unlink(missing_ok=True)
+                removed_files += 1
+    return removed_files
+
+
+def convert_data_to_dicom(input_filepath, input_json, json_backend=None,
+                          image_format=None, resume=False, file_timings=None):
     """
     Convert data available in input_json to DICOM file
 
     Args:
         input_filepath (str): Input JSON file
         input_json (object): Input file description (see README.md)
+        json_backend (object, optional): JSON backend used to read
+            templates. Defaults to the fastest available backend.
+        image_format (ImageFormat, optional): Format of image files.
+            Defaults to the format given by each image file suffix.
+        resume (bool, optional): Skip the object when its output file is
+            already complete. Defaults to False.
+        file_timings (FileTimings, optional): Timings of each conversion
+            stage of the object. Defaults to None.
 
     Raises:
         ValueError: Invalid value in the JSON file
+
+    Returns:
+        str: Output DICOM filepath, None when the object is skipped
     """
     if not JsonConstants.TEMPLATE.value in input_json:
         template_error = "Cannot find mandatory JSON field name '{}' in '{}'".format(
             JsonConstants.TEMPLATE.value, str(input_filepath))
         raise ValueError(template_error)
 
+    # Check if a specific output filename is specified
+    output_filename = None
+    if JsonConstants.OUTPUT.value in input_json:
+        output_filename = input_json[JsonConstants.OUTPUT.value]
+    if resume and output_filename and is_complete_dicom_file(
+            DEFAULT_OUTPUT_DIR / Path(output_filename)):
+        logger.debug("Skip '%s', output file already exists", output_filename)
+        return None
+
     template_filepath = Path(input_json[JsonConstants.TEMPLATE.value])
     if not template_filepath.exists():
         template_not_exists = "'{}' template file does not exists, abort json2dicom execution!".format(
@@ -46,78 +311,13 @@ def convert_data_to_dicom(input_filepath, input_json):
             template_filepath)
         raise ValueError(template_is_not_file)
 
-    template_file = open(template_filepath, "r")
-    current_json = json.loads(template_file.read())
+    dicom_dataset, dicom_meta = load_template(
+        input_filepath, template_filepath, json_backend, file_timings)
 
     # Override template object if 'data' key is present
     if JsonConstants.DATA.value in input_json:
-        current_json[JsonConstants.DATA.value].update(
-            input_json[JsonConstants.DATA.value])
-
-    # Check if a specific output filename is specified
-    output_filename = None
-    if JsonConstants.OUTPUT.value in input_json:
-        output_filename = input_json[JsonConstants.OUTPUT.value]
-
-    dicom_dataset = Dataset()
-    dicom_meta = Dataset()
-
-    # Parse each data DICOM value, to test if valid
-    data_dict = current_json[JsonConstants.DATA.value]
-    dicom_fields_with_error = []
-    for dicom_json_value in data_dict:
-        dicom_dict = {
-            dicom_json_value: data_dict.get(dicom_json_value)}
-        try:
-            Dataset().from_json(json.dumps(dicom_dict))
-        except (json.JSONDecodeError, TypeError, ValueError) as exception_error:
-            dicom_fields_with_error.append(dicom_json_value)
-            logger.warning("%s cannot add the field '%s', because the value is not standard with the VR: '%s'",
-                           input_filepath, dicom_json_value, dicom_dict)
-    # Remove error DICOM fields
-    for dicom_field_with_error in dicom_fields_with_error:
-        del data_dict[dicom_field_with_error]
-
-    try:
-        dicom_dataset = Dataset().from_json(data_dict)
-        dicom_meta = Dataset().from_json(
-            current_json[JsonConstants.META.value])
-    except (json.JSONDecodeError, TypeError, ValueError) as exception_error:
-        exception_error = "Error encountered during JSON parsing: \"{}\", abort json2dicom execution!".format(
-            exception_error)
-        raise ValueError(exception_error)
-
-    # Override image in the DICOM if 'image' key is present
-    if JsonConstants.IMAGE.value in input_json:
-        image_json_data = input_json[JsonConstants.IMAGE.value]
-        if image_json_data:
-            if image_json_data:
-                image_filepath = Path(image_json_data)
-                if not image_filepath.exists():
-                    image_not_exists = "'{}' image file does not exists, abort json2dicom execution!".format(
-                        image_filepath)
-                    raise ValueError(image_not_exists)
-            if not image_filepath.is_file():
-                image_is_not_file = "'{}' image is not a file, abort json2dicom execution!".format(
-                    image_filepath)
-                raise ValueError(image_is_not_file)
-
-            image = cv2.imread(str(image_filepath),
-                               flags=cv2.IMREAD_UNCHANGED)
-            shape = image.shape
-            bit_depth = None
-            if len(shape) < 3:
-                bit_depth = 8 * image.dtype.itemsize
-            else:
-                raise ValueError(
-                    "Cannot manage image with bit depth > 16 bits")
-
-            dicom_dataset.BitsAllocated = bit_depth
-            dicom_dataset.BitsStored = bit_depth
-            dicom_dataset.HighBits = bit_depth - 1
-            dicom_dataset.Rows = shape[0]
-            dicom_dataset.Columns = shape[1]
-            dicom_dataset.PixelData = image
+        override_dataset(input_filepath, dicom_dataset, input_json[JsonConstants.DATA.value],
+                         Path(input_filepath).parent, file_timings)
 
     # Format output filepath
     output_filepath = None
@@ -126,40 +326,176 @@ def convert_data_to_dicom(input_filepath, input_json):
     else:
         output_filepath = (
             DEFAULT_OUTPUT_DIR / dicom_dataset.SOPInstanceUID).with_suffix(DicomConstants.SUFFIX.value)
+        if resume and is_complete_dicom_file(output_filepath):
+            logger.debug("Skip '%s', output file already exists", output_filepath)
+            return None
+
+    # Override image in the DICOM if 'image' key is present
+    pixel_data = None
+    if JsonConstants.IMAGE.value in input_json:
+        image_json_data = input_json[JsonConstants.IMAGE.value]
+        if image_json_data:
+            with measure(file_timings, Stage.PIXEL_DECODE):
+                image = load_image(image_json_data, image_format, dicom_dataset,
+                                   file_timings)
+                # PixelData is written after the other fields, from the image buffer
+                pixel_data = set_image(dicom_dataset, image)
 
-    dataset = FileDataset(output_filepath.stem,
-                          dicom_dataset, file_meta=dicom_meta, preamble=b"\0" * 128)
-    dataset.is_little_endian = True
-    dataset.is_implicit_VR = False
-    dataset.save_as(str(output_filepath))
+    write_dicom_file(dicom_dataset, dicom_meta, output_filepath, pixel_data, file_timings)
     logger.debug("Output file has been writed at: '%s'", output_filepath)
+    return str(output_filepath)
+
+
+def convert_indexed_data_to_dicom(task, input_filepath, keep_going=False, **convert_options):
+    """
+    Convert an input object, and describe its failure instead of raising
+    it when keep_going is set
+
+    Args:
+        task (tuple): Object index in the input file and object
+        input_filepath (str): Input JSON file
+        keep_going (bool, optional): Return conversion errors instead of
+            raising them. Defaults to False.
+        convert_options: convert_data_to_dicom keyword arguments
 
+    Raises:
+        ValueError: Invalid value in the object, without keep_going
 
-def json2dicom(input_filepath):
+    Returns:
+        ConvertedObject or FailedObject: Converted object with its timings,
+            or failure description. None when the object is skipped
     """
-    Convert JSON input file to DICOM
+    index, input_json = task
+    file_timings = FileTimings()
+    try:
+        if isinstance(input_json, InvalidGeneratedObject):
+            # The 'generate' specification failed while the input was expanded
+            error = input_json.error
+            input_json = input_json.input_json
+            raise error
+        output = convert_data_to_dicom(input_filepath, input_json,
+                                       file_timings=file_timings, **convert_options)
+    except (AttributeError, KeyError, OSError, TypeError, ValueError) as error:
+        if not keep_going:
+            raise error
+        template = input_json.get(JsonConstants.TEMPLATE.value) \
+            if isinstance(input_json, dict) else None
+        return FailedObject(index, template, str(error), type(error).__name__)
+    return None if output is None else ConvertedObject(index, output, file_timings)
+
+
+def json2dicom(input_filepath, json_backend=None, image_format=None, workers=1,
+               keep_going=False, error_report_filepath=DEFAULT_ERROR_REPORT_FILEPATH,
+               retry_report_filepath=None, resume=False, timings_report_filepath=None,
+               metrics=None):
+    """
+    Convert JSON input file to DICOM. A JSON Lines input file ('.jsonl')
+    is read one object at a time
 
     Args:
-        input_filepath (str): Input JSON filepath
+        input_filepath (str): Input JSON or JSON Lines filepath
+        json_backend (object, optional): JSON backend. Defaults to the
+            fastest available backend.
+        image_format (ImageFormat, optional): Format of image files.
+            Defaults to the format given by each image file suffix.
+        workers (int, optional): Number of worker processes. Defaults to 1.
+        keep_going (bool, optional): Convert every object, failed objects
+            are written to the error report. Defaults to False.
+        error_report_filepath (Path, optional): JSON Lines error report
+            written with keep_going. Defaults to
+            'output/_json2dicom_errors.jsonl'.
+        retry_report_filepath (Path, optional): Error report of a previous
+            run, only the objects it lists are converted. Defaults to None.
+        resume (bool, optional): Skip objects whose output file is already
+            complete, to restart an interrupted run, and remove its
+            temporary files. Defaults to False.
+        timings_report_filepath (Path, optional): JSON Lines report of the
+            stage timings of each converted object. Defaults to None.
+        metrics (MetricsExporter, optional): Metrics exported while objects
+            are converted. Defaults to None.
 
     Raises:
         error: Error encountered during conversion
+
+    Returns:
+        int: Number of failed objects, always 0 without keep_going
     """
     try:
-        input_file = open(input_filepath, "r")
-        input_json = json.loads(input_file.read())
-
-        if isinstance(input_json, list):
-            for json_object in input_json:
-                try:
-                    convert_data_to_dicom(input_filepath, json_object)
-                except (ValueError) as error:
-                    raise error
-        else:
-            try:
-                convert_data_to_dicom(input_filepath, input_json)
-            except (ValueError) as error:
-                raise error
+        if json_backend is None:
+            json_backend = get_json_backend()
+        if resume:
+            removed_files = remove_temporary_files()
+            if removed_files:
+                logger.info("%d temporary file(s) of an interrupted run removed from '%s'",
+                            removed_files, DEFAULT_OUTPUT_DIR)
+        convert = partial(convert_indexed_data_to_dicom,
+                          input_filepath=input_filepath, keep_going=keep_going,
+                          json_backend=json_backend, image_format=image_format,
+                          resume=resume)
+        # Objects with a 'generate' specification are expanded one object at a time
+        tasks = enumerate(expand_json_objects(
+            read_json_objects(input_filepath, json_backend)))
+        if retry_report_filepath is not None:
+            # Read before the report is overwritten, it may be the same file
+            retry_indices = read_failed_indices(
+                retry_report_filepath, json_backend)
+            tasks = (task for task in tasks if task[0] in retry_indices)
+
+        failures = 0
+        summary = RunSummary()
+        with ExitStack() as stack:
+            error_report = None
+            timings_report = None
+            prefetch = None
+            if metrics is not None:
+                # Entered first so an error aborting the run is counted
+                stack.enter_context(metrics)
+                metrics.set_workers(workers)
+            if keep_going:
+                error_report = stack.enter_context(JsonLinesManifestWriter(
+                    error_report_filepath, json_backend))
+            if timings_report_filepath is not None:
+                timings_report = stack.enter_context(JsonLinesManifestWriter(
+                    timings_report_filepath, json_backend))
+            if workers > 1:
+                # Results are yielded in the input order, so the error raised
+                # is the one of the first invalid object, whatever the worker
+                log_queue = stack.enter_context(worker_log_queue())
+                pool = stack.enter_context(multiprocessing.Pool(
+                    workers, initializer=init_worker_logging,
+                    initargs=(log_queue, logging.getLogger().level)))
+                # Objects are parsed only a few chunks ahead of the workers
+                prefetch = stack.enter_context(BoundedPrefetch(
+                    tasks, prefetch_limit(workers, DEFAULT_CHUNKSIZE)))
+                results = pool.imap(convert, prefetch, chunksize=DEFAULT_CHUNKSIZE)
+            else:
+                results = map(convert, tasks)
+            for result in results:
+                if isinstance(result, FailedObject):
+                    logger.warning("Object %d of %s cannot be converted: %s",
+                                   result.index, input_filepath, result.reason)
+                    error_report.write(result)
+                    failures += 1
+                    if metrics is not None:
+                        metrics.add_failure(result.error_type)
+                elif result is not None:
+                    summary.add(result.timings)
+                    if timings_report is not None:
+                        timings_report.write(result)
+                    if metrics is not None:
+                        metrics.add(result.timings)
+                elif metrics is not None:
+                    metrics.add(None)
+                if prefetch is not None:
+                    prefetch.release()
+            if workers > 1:
+                pool.close()
+                pool.join()
+        summary.log()
+        if failures:
+            logger.error("%d object(s) of %s cannot be converted, see '%s'",
+                         failures, input_filepath, error_report_filepath)
+        return failures
     except (FileNotFoundError, SystemError) as error:
         raise error
 
@@ -181,9 +517,74 @@ def main():
         type=str,
         help="json to convert to dicom")
 
+    # Optionals arguments
+    parser.add_argument(
+        "-jb",
+        "--json-backend",
+        choices=["auto", "json", "orjson"],
+        help="library used to read JSON files, 'auto' uses orjson when installed",
+        default="auto")
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="number of worker processes used to convert JSON objects",
+        default=1)
+    keep_going_help = "convert every object even when some of them fail, failed \
+        objects are written to the error report with their index, template and reason."
+    parser.add_argument(
+        "-kg",
+        "--keep-going",
+        action="store_true",
+        help=keep_going_help)
+    parser.add_argument(
+        "-er",
+        "--error-report",
+        type=str,
+        help="JSON Lines error report written with --keep-going",
+        default=str(DEFAULT_ERROR_REPORT_FILEPATH))
+    parser.add_argument(
+        "-rf",
+        "--retry-failed",
+        type=str,
+        metavar="ERROR_REPORT",
+        help="only convert the objects listed in the error report of a previous run of the same input file",
+        default=None)
+    resume_help = "skip objects whose output DICOM file already exists and is \
+        complete, to restart an interrupted run. Files are written under a \
+        temporary name ('<name>.<pid>.part') and renamed once complete, the \
+        temporary files left in the output directory are removed."
+    parser.add_argument(
+        "-rs",
+        "--resume",
+        action="store_true",
+        help=resume_help)
+    parser.add_argument(
+        "-if",
+        "--image-format",
+        choices=[image_format.value for image_format in ImageFormat],
+        help="format of image files, found from each file suffix by default "
+             "('.npy', '.raw', otherwise png)",
+        default=None)
+    timings_report_help = "JSON Lines report of the duration of each conversion \
+        stage, and of the bytes read and written, of each converted object."
+    parser.add_argument(
+        "-tr",
+        "--timings-report",
+        type=str,
+        help=timings_report_help,
+        default=None)
+    add_logging_arguments(parser)
+    add_metrics_arguments(parser)
+
     args = parser.parse_args()
+    configure_logging(log_level=args.log_level, asynchronous=args.async_logging)
 
     input_filepath = Path(args.input_json_file)
+    if args.workers < 1:
+        workers_error = "{} is not a valid number of workers, abort json2dicom execution!".format(
+            args.workers)
+        raise ValueError(workers_error)
     if not input_filepath.exists():
         input_not_exists = "{} does not exists, abort json2dicom execution!".format(
             input_filepath)
@@ -192,19 +593,32 @@ def main():
         input_is_not_file = "{} is not a file, abort json2dicom execution!".format(
             input_filepath)
         raise ValueError(input_is_not_file)
+    if args.retry_failed and not Path(args.retry_failed).is_file():
+        retry_failed_error = "{} error report does not exists, abort json2dicom execution!".format(
+            args.retry_failed)
+        raise ValueError(retry_failed_error)
+    metrics = metrics_from_args("json2dicom", args)
 
     try:
-        json2dicom(input_filepath)
+        image_format = ImageFormat(args.image_format) \
+            if args.image_format else None
+        failures = json2dicom(input_filepath, get_json_backend(args.json_backend),
+                              image_format, args.workers, args.keep_going,
+                              Path(args.error_report),
+                              Path(args.retry_failed) if args.retry_failed else None,
+                              args.resume,
+                              Path(args.timings_report) if args.timings_report else None,
+                              metrics)
     except Exception as error:
         raise error
+    return 1 if failures else 0
 
 
 if __name__ == "__main__":
     """Entry point of the script
     """
     try:
-        main()
-        exit(0)
+        exit(main())
     except ValueError as error:
         logger.exception(error)
         exit(1)
@@ -0,0 +1,198 @@
+"""json_backend
+Contains pluggable JSON encoders and decoders.
+The orjson library is used when installed, otherwise the standard library
+json module is used. Pretty files are always written by the standard
+library, so their bytes do not depend on the installed libraries.
+"""
+
+import json
+from constants import JsonStyle
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class StdlibJsonBackend:
+    """StdlibJsonBackend
+    JSON encoder and decoder based on the standard library
+    """
+    name = "json"
+
+    def dumps(self, data, json_style=JsonStyle.PRETTY):
+        """dumps
+        Serialize data to JSON
+
+        Arguments:
+            data {object} -- Data to serialize
+
+        Keyword Arguments:
+            json_style {JsonStyle} -- Output layout (default: {JsonStyle.PRETTY})
+
+        Returns:
+            bytes -- UTF-8 encoded JSON
+        """
+        if json_style == JsonStyle.COMPACT:
+            return json.dumps(data, separators=(",", ":")).encode("utf-8")
+        return json.dumps(data, indent=2, sort_keys=True).encode("utf-8")
+
+    def loads(self, data):
+        """loads
+        Deserialize JSON
+
+        Arguments:
+            data {bytes} -- JSON document
+
+        Returns:
+            object -- Deserialized data
+        """
+        return json.loads(data)
+
+
+class OrjsonBackend:
+    """OrjsonBackend
+    JSON encoder and decoder based on the orjson library
+    """
+    name = "orjson"
+
+    @staticmethod
+    def default(value):
+        """default
+        Serialize values that orjson does not know, like float subclasses
+
+        Arguments:
+            value {object} -- Value to serialize
+
+        Raises:
+            TypeError: Value cannot be serialized
+
+        Returns:
+            object -- Serializable value
+        """
+        if isinstance(value, float):
+            return float(value)
+        if isinstance(value, int):
+            return int(value)
+        raise TypeError("Type is not JSON serializable: {}".format(
+            type(value).__name__))
+
+    def dumps(self, data, json_style=JsonStyle.PRETTY):
+        """dumps
+        Serialize data to JSON
+
+        Arguments:
+            data {object} -- Data to serialize
+
+        Keyword Arguments:
+            json_style {JsonStyle} -- Output layout (default: {JsonStyle.PRETTY})
+
+        Returns:
+            bytes -- UTF-8 encoded JSON
+        """
+        option = None
+        if json_style == JsonStyle.PRETTY:
+            option = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+        return orjson.dumps(data, default=self.default, option=option)
+
+    def loads(self, data):
+        """loads
+        Deserialize JSON
+
+        Arguments:
+            data {bytes} -- JSON document
+
+        Returns:
+            object -- Deserialized data
+        """
+        return orjson.loads(data)
+
+
+class AutoJsonBackend:
+    """AutoJsonBackend
+    JSON encoder and decoder using orjson when installed, except for pretty
+    output: orjson writes non-ASCII characters unescaped, floats like 1e-7
+    instead of 1e-07 and NaN as null, so pretty files are written by the
+    standard library to keep their bytes stable. Documents orjson rejects,
+    like those holding NaN, are read by the standard library
+    """
+    name = "auto"
+
+    def __init__(self):
+        self.stdlib_backend = StdlibJsonBackend()
+        self.fast_backend = OrjsonBackend() if orjson is not None else self.stdlib_backend
+
+    def dumps(self, data, json_style=JsonStyle.PRETTY):
+        """dumps
+        Serialize data to JSON
+
+        Arguments:
+            data {object} -- Data to serialize
+
+        Keyword Arguments:
+            json_style {JsonStyle} -- Output layout (default: {JsonStyle.PRETTY})
+
+        Returns:
+            bytes -- UTF-8 encoded JSON
+        """
+        if json_style == JsonStyle.PRETTY:
+            return self.stdlib_backend.dumps(data, json_style)
+        return self.fast_backend.dumps(data, json_style)
+
+    def loads(self, data):
+        """loads
+        Deserialize JSON
+
+        Arguments:
+            data {bytes} -- JSON document
+
+        Returns:
+            object -- Deserialized data
+        """
+        try:
+            return self.fast_backend.loads(data)
+        except ValueError:
+            # orjson rejects the NaN and Infinity written by the standard library
+            return self.stdlib_backend.loads(data)
+
+
+JSON_BACKENDS = {
+    StdlibJsonBackend.name: StdlibJsonBackend,
+    OrjsonBackend.name: OrjsonBackend,
+}
+
+
+def available_json_backends():
+    """available_json_backends
+    List JSON backends which can be used in the current environment
+
+    Returns:
+        list -- Backend names
+    """
+    if orjson is None:
+        return [StdlibJsonBackend.name]
+    return [StdlibJsonBackend.name, OrjsonBackend.name]
+
+
+def get_json_backend(name="auto"):
+    """get_json_backend
+    Create a JSON backend
+
+    Keyword Arguments:
+        name {str} -- Backend name, 'auto' selects the fastest
+            available backend for reading and compact output
+            (default: {"auto"})
+
+    Raises:
+        ValueError: Unknown or unavailable backend
+
+    Returns:
+        object -- JSON backend
+    """
+    if name == AutoJsonBackend.name:
+        return AutoJsonBackend()
+    if name not in available_json_backends():
+        backend_error = "'{}' JSON backend is not available, use one of: {}".format(
+            name, ", ".join(available_json_backends()))
+        raise ValueError(backend_error)
+    return JSON_BACKENDS[name]()
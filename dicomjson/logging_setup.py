@@ -0,0 +1,148 @@
+"""logging_setup
+Contains logging helpers shared by scripts and their worker processes
+"""
+
+import atexit
+from contextlib import contextmanager
+import logging
+from logging import config, handlers
+import multiprocessing
+from pathlib import Path
+import queue
+
+DEFAULT_LOGGER_CONFIG_FILEPATH = Path(__file__).parent / Path("logger_config.yaml")
+# Levels accepted by the --log-level option of the scripts
+LOG_LEVELS = ("debug", "info", "warning", "error")
+
+
+def add_logging_arguments(parser):
+    """add_logging_arguments
+    Add the logging options shared by the scripts to their parser
+
+    Arguments:
+        parser {argparse.ArgumentParser} -- Script arguments parser
+    """
+    parser.add_argument(
+        "-ll",
+        "--log-level",
+        choices=LOG_LEVELS,
+        help="minimum level of logged messages, messages below it are not even \
+            formatted (default: debug)",
+        default="debug")
+    async_logging_help = "write log messages from a background thread, the \
+        conversion only puts them in a queue. Worker processes share the queue."
+    parser.add_argument(
+        "-al",
+        "--async-logging",
+        action="store_true",
+        help=async_logging_help)
+
+
+def configure_logging(logger_config_filepath=DEFAULT_LOGGER_CONFIG_FILEPATH,
+                      log_level=None, asynchronous=False):
+    """configure_logging
+    Configure the logging handlers of a script from a YAML file. It is
+    called by the script entry points, importing a script module does not
+    change the logging configuration
+
+    Keyword Arguments:
+        logger_config_filepath {Path} -- YAML logging configuration
+            (default: {DEFAULT_LOGGER_CONFIG_FILEPATH})
+        log_level {str} -- Root logger level overriding the YAML level,
+            one of LOG_LEVELS (default: {None})
+        asynchronous {bool} -- Emit records from a listener thread, see
+            start_asynchronous_logging (default: {False})
+    """
+    import yaml  # pylint: disable=import-outside-toplevel
+    with open(logger_config_filepath, 'rt') as f:
+        config_data = yaml.safe_load(f.read())
+        config.dictConfig(config_data)
+    if log_level is not None:
+        logging.getLogger().setLevel(log_level.upper())
+    if asynchronous:
+        start_asynchronous_logging()
+
+
+class LocalQueueHandler(handlers.QueueHandler):
+    """LocalQueueHandler
+    QueueHandler of a queue consumed in the same process. Records are
+    queued as is, their message is formatted by the listener thread
+    """
+
+    def prepare(self, record):
+        """prepare
+        Keep the record as is, it is not sent to another process
+
+        Arguments:
+            record {logging.LogRecord} -- Record to queue
+
+        Returns:
+            logging.LogRecord -- Same record
+        """
+        return record
+
+
+def start_asynchronous_logging():
+    """start_asynchronous_logging
+    Put a QueueHandler in front of the root handlers. A logging call only
+    puts the record in a queue, the records are formatted and written to
+    stdout and to the log file by a listener thread. The queue is flushed
+    when the script exits
+
+    Returns:
+        logging.handlers.QueueListener -- Started listener
+    """
+    root_logger = logging.getLogger()
+    root_handlers = list(root_logger.handlers)
+    log_queue = queue.SimpleQueue()
+    listener = handlers.QueueListener(
+        log_queue, *root_handlers, respect_handler_level=True)
+    for handler in root_handlers:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(LocalQueueHandler(log_queue))
+    listener.start()
+    # Registered after logging.shutdown, so it is called before it
+    atexit.register(listener.stop)
+    return listener
+
+
+def init_worker_logging(log_queue, log_level=logging.WARNING):
+    """init_worker_logging
+    Replace the handlers of a worker process by a single QueueHandler,
+    so every record is emitted by the parent process handlers. Workers
+    started with 'spawn' or 'forkserver' do not inherit the root level
+    of the parent process, it is given to them
+
+    Arguments:
+        log_queue {multiprocessing.Queue} -- Queue consumed by the parent listener
+
+    Keyword Arguments:
+        log_level {int} -- Root logger level of the parent process
+            (default: {logging.WARNING})
+    """
+    root_logger = logging.getLogger()
+    root_logger.setLevel(log_level)
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(handlers.QueueHandler(log_queue))
+
+
+@contextmanager
+def worker_log_queue():
+    """worker_log_queue
+    Forward records sent by worker processes to the current root handlers.
+    Records are emitted one at a time by a single listener thread, so lines
+    coming from different workers are never interleaved. With asynchronous
+    logging, worker records join the queue of the parent process records
+
+    Yields:
+        multiprocessing.Queue -- Queue to give to init_worker_logging
+    """
+    log_queue = multiprocessing.Queue()
+    listener = handlers.QueueListener(
+        log_queue, *logging.getLogger().handlers, respect_handler_level=True)
+    listener.start()
+    try:
+        yield log_queue
+    finally:
+        listener.stop()
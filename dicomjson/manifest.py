@@ -0,0 +1,361 @@
+"""manifest
+Contains readers and writers of the files listing converted DICOM items
+"""
+
+import codecs
+from dataclasses import dataclass
+import hashlib
+import json
+from pathlib import Path
+import re
+from constants import JsonConstants, JsonLinesConstants, JsonStyle
+
+# Size of the blocks read from a JSON array file
+DEFAULT_READ_SIZE = 1 << 20
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+@dataclass
+class DicomConvertedData:
+    """Class for keeping track of converted DICOM items"""
+    # Image filepath, or image filepaths of each frame
+    image: object
+    output: str
+    template: str
+    # Source file description, only filled by incremental runs
+    source: str = None
+    size: int = None
+    mtime: int = None
+    sha256: str = None
+    # FileTimings of the conversion stages, only written when requested
+    timings: object = None
+    # Exception class name of a failure which was only logged, counted by
+    # metrics, not written in the manifest
+    error_type: str = None
+
+    def to_json_dict(self):
+        """to_json_dict
+        Describe the converted item as a json2dicom input object
+
+        Returns:
+            dict -- json2dicom input object
+        """
+        json_dict = {
+            JsonConstants.TEMPLATE.value: self.template,
+            JsonConstants.IMAGE.value: self.image,
+            JsonConstants.OUTPUT.value: self.output
+        }
+        for key, value in ((JsonConstants.SOURCE, self.source),
+                           (JsonConstants.SIZE, self.size),
+                           (JsonConstants.MTIME, self.mtime),
+                           (JsonConstants.SHA256, self.sha256)):
+            if value is not None:
+                json_dict[key.value] = value
+        if self.timings is not None:
+            json_dict[JsonConstants.TIMINGS.value] = self.timings.to_json_dict()
+        return json_dict
+
+    @classmethod
+    def from_json_dict(cls, json_dict):
+        """from_json_dict
+        Create a converted item from a manifest entry
+
+        Arguments:
+            json_dict {dict} -- Manifest entry
+
+        Returns:
+            DicomConvertedData -- Converted item
+        """
+        return cls(json_dict.get(JsonConstants.IMAGE.value),
+                   json_dict.get(JsonConstants.OUTPUT.value),
+                   json_dict.get(JsonConstants.TEMPLATE.value),
+                   json_dict.get(JsonConstants.SOURCE.value),
+                   json_dict.get(JsonConstants.SIZE.value),
+                   json_dict.get(JsonConstants.MTIME.value),
+                   json_dict.get(JsonConstants.SHA256.value))
+
+    def outputs_exist(self):
+        """outputs_exist
+        Check if the files written by the conversion are still available
+
+        Returns:
+            bool -- True if the template and image files exist
+        """
+        images = self.image if isinstance(self.image, list) else [self.image]
+        return (self.template is not None
+                and Path(self.template).is_file()
+                and all(image is None or Path(image).is_file() for image in images))
+
+
+@dataclass
+class FailedObject:
+    """Class for keeping track of a json2dicom input object which could
+    not be converted"""
+    # Position of the object in the input file, starting at 0
+    index: int
+    template: str
+    reason: str
+    # Exception class name counted by metrics, not written in the error report
+    error_type: str = None
+
+    def to_json_dict(self):
+        """to_json_dict
+        Describe the failure as an error report entry
+
+        Returns:
+            dict -- Error report entry
+        """
+        return {
+            JsonConstants.INDEX.value: self.index,
+            JsonConstants.TEMPLATE.value: self.template,
+            JsonConstants.REASON.value: self.reason
+        }
+
+    @classmethod
+    def from_json_dict(cls, json_dict):
+        """from_json_dict
+        Create a failure from an error report entry
+
+        Arguments:
+            json_dict {dict} -- Error report entry
+
+        Returns:
+            FailedObject -- Failed object
+        """
+        return cls(json_dict[JsonConstants.INDEX.value],
+                   json_dict.get(JsonConstants.TEMPLATE.value),
+                   json_dict.get(JsonConstants.REASON.value))
+
+
+@dataclass
+class ConvertedObject:
+    """Class for keeping track of a json2dicom input object converted to a
+    DICOM file"""
+    # Position of the object in the input file, starting at 0
+    index: int
+    output: str
+    # FileTimings of the conversion stages
+    timings: object
+
+    def to_json_dict(self):
+        """to_json_dict
+        Describe the converted object as a timings report entry
+
+        Returns:
+            dict -- Timings report entry
+        """
+        return {
+            JsonConstants.INDEX.value: self.index,
+            JsonConstants.OUTPUT.value: self.output,
+            JsonConstants.TIMINGS.value: self.timings.to_json_dict()
+        }
+
+
+def file_sha256(filepath):
+    """file_sha256
+    Compute the SHA-256 digest of a file, without loading it in memory
+
+    Arguments:
+        filepath {Path} -- File location
+
+    Returns:
+        str -- Hexadecimal digest
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as input_file:
+        for chunk in iter(lambda: input_file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class JsonManifestWriter:
+    """JsonManifestWriter
+    Write every converted item as a single JSON array, once all items are known
+    """
+
+    def __init__(self, filepath, json_backend, json_style=JsonStyle.PRETTY):
+        self.filepath = filepath
+        self.json_backend = json_backend
+        self.json_style = json_style
+        self.entries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Keep the previous behavior, nothing is written on failure
+        if exc_type is None:
+            with open(self.filepath, "wb") as manifest_file:
+                manifest_file.write(self.json_backend.dumps(
+                    self.entries, self.json_style))
+
+    def write(self, converted_data):
+        """write
+        Add a converted item to the manifest
+
+        Arguments:
+            converted_data {DicomConvertedData} -- Converted item
+        """
+        self.entries.append(converted_data.to_json_dict())
+
+
+class JsonLinesManifestWriter:
+    """JsonLinesManifestWriter
+    Write each converted item on its own line as soon as it is known,
+    so the manifest stays usable if the conversion is interrupted.
+    Any item with a to_json_dict method can be written, like FailedObject
+    entries of the json2dicom error report
+    """
+
+    def __init__(self, filepath, json_backend):
+        self.filepath = filepath
+        self.json_backend = json_backend
+        self.manifest_file = None
+
+    def __enter__(self):
+        self.manifest_file = open(self.filepath, "wb")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.manifest_file.close()
+
+    def write(self, converted_data):
+        """write
+        Append a converted item to the manifest and flush it
+
+        Arguments:
+            converted_data {DicomConvertedData} -- Converted item
+        """
+        self.manifest_file.write(self.json_backend.dumps(
+            converted_data.to_json_dict(), JsonStyle.COMPACT) + b"\n")
+        self.manifest_file.flush()
+
+
+def iter_json_array(input_file, block, read_size=DEFAULT_READ_SIZE):
+    """iter_json_array
+    Parse the items of a top-level JSON array one at a time, so memory
+    usage is bounded by the largest item instead of the file size.
+    The standard library decoder is used, it can parse a value from the
+    middle of a string
+
+    Arguments:
+        input_file {file} -- File opened in binary mode, after block
+        block {bytes} -- Beginning of the file, starting with '['
+
+    Keyword Arguments:
+        read_size {int} -- Minimum size of the blocks read from the file
+            (default: {DEFAULT_READ_SIZE})
+
+    Raises:
+        ValueError: Invalid or truncated JSON array
+
+    Yields:
+        object -- Array item
+    """
+    decoder = json.JSONDecoder()
+    utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+    text = utf8_decoder.decode(block)
+    end_of_file = False
+    position = 1
+    expect_item = True
+    first_item = True
+    while True:
+        position = WHITESPACE.match(text, position).end()
+        if position < len(text) and text[position] == "]" and not (expect_item and not first_item):
+            if text[position + 1:].strip() or input_file.read(read_size).strip():
+                raise ValueError("Unexpected data after the JSON array")
+            return
+        if position < len(text) and not expect_item:
+            if text[position] != ",":
+                raise ValueError(
+                    "Expecting ',' delimiter in the JSON array at character {}".format(position))
+            position += 1
+            expect_item = True
+            continue
+        if position < len(text):
+            try:
+                item, end = decoder.raw_decode(text, position)
+                # A number may continue in the next block
+                if end < len(text) or end_of_file:
+                    yield item
+                    position = end
+                    expect_item = False
+                    first_item = False
+                    continue
+            except json.JSONDecodeError:
+                if end_of_file:
+                    raise
+        elif end_of_file:
+            raise ValueError("Truncated JSON array")
+
+        # The current item is incomplete, read at least as much as it holds
+        # so a large item is not parsed again for each block
+        text = text[position:]
+        position = 0
+        block = input_file.read(max(read_size, len(text)))
+        end_of_file = not block
+        text += utf8_decoder.decode(block, final=end_of_file)
+
+
+def read_json_objects(input_filepath, json_backend):
+    """read_json_objects
+    Read json2dicom input objects. A JSON Lines file is read line by line,
+    an array of objects is read one object at a time, otherwise the file
+    holds a single object
+
+    Arguments:
+        input_filepath {Path} -- Input JSON or JSON Lines file
+        json_backend {object} -- JSON backend
+
+    Yields:
+        dict -- json2dicom input object
+    """
+    with open(input_filepath, "rb") as input_file:
+        if Path(input_filepath).suffix == JsonLinesConstants.SUFFIX.value:
+            for line in input_file:
+                if line.strip():
+                    yield json_backend.loads(line)
+            return
+        block = input_file.read(DEFAULT_READ_SIZE)
+        if block.lstrip().startswith(b"["):
+            yield from iter_json_array(input_file, block.lstrip())
+            return
+        input_json = json_backend.loads(block + input_file.read())
+    yield input_json
+
+
+def read_converted_data(manifest_filepath, json_backend):
+    """read_converted_data
+    Read the items of a previous incremental run
+
+    Arguments:
+        manifest_filepath {Path} -- Previous manifest location
+        json_backend {object} -- JSON backend
+
+    Returns:
+        dict -- DicomConvertedData items indexed by source file
+    """
+    if not Path(manifest_filepath).is_file():
+        return {}
+    converted_data = {}
+    for json_object in read_json_objects(manifest_filepath, json_backend):
+        source = json_object.get(JsonConstants.SOURCE.value)
+        if source is not None:
+            converted_data[source] = DicomConvertedData.from_json_dict(
+                json_object)
+    return converted_data
+
+
+def read_failed_indices(report_filepath, json_backend):
+    """read_failed_indices
+    Read the indices of the objects listed in a json2dicom error report
+
+    Arguments:
+        report_filepath {Path} -- Error report location
+        json_backend {object} -- JSON backend
+
+    Returns:
+        set -- Indices of the failed objects
+    """
+    return {FailedObject.from_json_dict(json_object).index
+            for json_object in read_json_objects(report_filepath, json_backend)}
@@ -0,0 +1,339 @@
+"""metrics
+Export the progress of a conversion run as Prometheus metrics, to a file
+read by the node_exporter textfile collector or from a local HTTP endpoint.
+Metrics are updated by the parent process from the results of the workers
+"""
+
+import os
+from pathlib import Path
+import threading
+import time
+
+DEFAULT_METRICS_ADDRESS = "127.0.0.1"
+# Minimum number of seconds between two writes of the metrics file
+DEFAULT_METRICS_INTERVAL = 15
+# Upper bounds of the stage duration histogram buckets, in seconds
+STAGE_DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                          0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_PATH = "/metrics"
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def add_metrics_arguments(parser):
+    """add_metrics_arguments
+    Add the metrics options shared by the scripts to their parser
+
+    Arguments:
+        parser {argparse.ArgumentParser} -- Script arguments parser
+    """
+    metrics_file_help = "write Prometheus metrics of the run to this file, for \
+        the node_exporter textfile collector. It is replaced atomically."
+    parser.add_argument(
+        "--metrics-file",
+        type=str,
+        help=metrics_file_help,
+        default=None)
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve Prometheus metrics of the run on http://ADDRESS:PORT/metrics",
+        default=None)
+    parser.add_argument(
+        "--metrics-address",
+        type=str,
+        help="address the metrics endpoint listens on (default: {})".format(
+            DEFAULT_METRICS_ADDRESS),
+        default=DEFAULT_METRICS_ADDRESS)
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        help="minimum number of seconds between two writes of the metrics file \
+            (default: {})".format(DEFAULT_METRICS_INTERVAL),
+        default=DEFAULT_METRICS_INTERVAL)
+
+
+def metrics_from_args(tool, args):
+    """metrics_from_args
+    Create the metrics exporter requested by the metrics options
+
+    Arguments:
+        tool {str} -- Script name, like "dicom2json"
+        args {argparse.Namespace} -- Parsed script arguments
+
+    Raises:
+        ValueError: Invalid metrics interval
+
+    Returns:
+        MetricsExporter -- Metrics exporter, None without metrics file or port
+    """
+    if args.metrics_interval < 0:
+        metrics_interval_error = "{} is not a valid metrics interval, abort {} execution!".format(
+            args.metrics_interval, tool)
+        raise ValueError(metrics_interval_error)
+    if args.metrics_file is None and args.metrics_port is None:
+        return None
+    return MetricsExporter(tool, args.metrics_file, args.metrics_port,
+                           args.metrics_address, args.metrics_interval)
+
+
+def escape_label_value(value):
+    """escape_label_value
+    Escape a label value of the Prometheus text format
+
+    Arguments:
+        value {str} -- Label value
+
+    Returns:
+        str -- Escaped value
+    """
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(labels):
+    """format_labels
+    Format the labels of a sample
+
+    Arguments:
+        labels {dict} -- Label values indexed by label name
+
+    Returns:
+        str -- Labels between braces
+    """
+    return "{" + ",".join("{}=\"{}\"".format(name, escape_label_value(value))
+                          for name, value in labels.items()) + "}"
+
+
+class StageHistogram:
+    """StageHistogram
+    Distribution of the durations of a conversion stage
+    """
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(STAGE_DURATION_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, duration):
+        """observe
+        Add a stage duration
+
+        Arguments:
+            duration {float} -- Duration in seconds
+        """
+        for index, upper_bound in enumerate(STAGE_DURATION_BUCKETS):
+            if duration <= upper_bound:
+                self.bucket_counts[index] += 1
+                break
+        self.count += 1
+        self.sum += duration
+
+
+class MetricsExporter:
+    """MetricsExporter
+    Count converted files, bytes, failures and stage durations of a run,
+    and expose them in the Prometheus text format. The metrics file is
+    replaced atomically, at most once per interval and when the run is over.
+    The HTTP endpoint is served by a background thread until the run is over
+    """
+
+    def __init__(self, tool, metrics_filepath=None, metrics_port=None,
+                 metrics_address=DEFAULT_METRICS_ADDRESS,
+                 metrics_interval=DEFAULT_METRICS_INTERVAL):
+        self.tool = tool
+        self.metrics_filepath = Path(metrics_filepath) if metrics_filepath else None
+        self.metrics_port = metrics_port
+        self.metrics_address = metrics_address
+        self.metrics_interval = metrics_interval
+        self.lock = threading.Lock()
+        self.server = None
+        self.last_write = None
+        self.start_time = time.time()
+        self.last_update_time = self.start_time
+        self.workers = 1
+        self.files = 0
+        self.skipped_files = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        # Number of failures indexed by reason
+        self.failures = {}
+        # StageHistogram indexed by Stage value
+        self.stages = {}
+
+    def __enter__(self):
+        if self.metrics_port is not None:
+            self.start_server()
+        self.write_metrics_file()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and issubclass(exc_type, Exception):
+            # The error aborting the run is the failure of its current file
+            self.add_failure(exc_type.__name__)
+        self.write_metrics_file()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def start_server(self):
+        """start_server
+        Serve the metrics on METRICS_PATH from a background thread
+        """
+        # Only runs exporting metrics over HTTP pay for its import
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # pylint: disable=import-outside-toplevel
+
+        exporter = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            """MetricsRequestHandler
+            Answer GET requests on METRICS_PATH with the current metrics
+            """
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """do_GET
+                Send the metrics, or a 404 error on another path
+                """
+                if self.path.split("?")[0] != METRICS_PATH:
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                """log_message
+                Do not log each scrape
+                """
+
+        self.server = ThreadingHTTPServer(
+            (self.metrics_address, self.metrics_port), MetricsRequestHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def set_workers(self, workers):
+        """set_workers
+        Record the number of worker processes of the run
+
+        Arguments:
+            workers {int} -- Number of worker processes
+        """
+        with self.lock:
+            self.workers = workers
+
+    def add(self, file_timings):
+        """add
+        Count a converted file, with its stage durations and sizes
+
+        Arguments:
+            file_timings {FileTimings} -- Timings, None for skipped files
+        """
+        with self.lock:
+            self.last_update_time = time.time()
+            if file_timings is None:
+                self.skipped_files += 1
+            else:
+                self.files += 1
+                self.bytes_read += file_timings.bytes_in
+                self.bytes_written += file_timings.bytes_out
+                for stage, duration in file_timings.durations.items():
+                    if stage not in self.stages:
+                        self.stages[stage] = StageHistogram()
+                    self.stages[stage].observe(duration)
+        self.write_metrics_file(periodic=True)
+
+    def add_failure(self, reason):
+        """add_failure
+        Count a file which could not be converted
+
+        Arguments:
+            reason {str} -- Failure reason, like the exception class name
+        """
+        with self.lock:
+            self.last_update_time = time.time()
+            self.failures[reason] = self.failures.get(reason, 0) + 1
+        self.write_metrics_file(periodic=True)
+
+    def render(self):
+        """render
+        Format the metrics in the Prometheus text format
+
+        Returns:
+            str -- Metrics
+        """
+        tool = {"tool": self.tool}
+        lines = []
+
+        def add_metric(name, metric_type, help_text, samples):
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            for suffix, labels, value in samples:
+                lines.append("{}{}{} {}".format(name, suffix, format_labels(labels), value))
+
+        with self.lock:
+            add_metric("dicomjson_files_total", "counter", "Files converted.",
+                       [("", tool, self.files)])
+            add_metric("dicomjson_files_skipped_total", "counter",
+                       "Files skipped because their output is up to date.",
+                       [("", tool, self.skipped_files)])
+            add_metric("dicomjson_read_bytes_total", "counter",
+                       "Bytes read from input files.",
+                       [("", tool, self.bytes_read)])
+            add_metric("dicomjson_written_bytes_total", "counter",
+                       "Bytes written to output files.",
+                       [("", tool, self.bytes_written)])
+            add_metric("dicomjson_failures_total", "counter",
+                       "Files which could not be converted, by reason.",
+                       [("", dict(tool, reason=reason), count)
+                        for reason, count in sorted(self.failures.items())])
+            samples = []
+            for stage, histogram in self.stages.items():
+                labels = dict(tool, stage=stage)
+                cumulative_count = 0
+                for upper_bound, bucket_count in zip(STAGE_DURATION_BUCKETS,
+                                                     histogram.bucket_counts):
+                    cumulative_count += bucket_count
+                    samples.append(("_bucket", dict(labels, le=repr(upper_bound)),
+                                    cumulative_count))
+                samples.append(("_bucket", dict(labels, le="+Inf"), histogram.count))
+                samples.append(("_sum", labels, repr(histogram.sum)))
+                samples.append(("_count", labels, histogram.count))
+            add_metric("dicomjson_stage_duration_seconds", "histogram",
+                       "Duration of each conversion stage of a file.", samples)
+            add_metric("dicomjson_workers", "gauge", "Worker processes of the run.",
+                       [("", tool, self.workers)])
+            add_metric("dicomjson_start_time_seconds", "gauge",
+                       "Start time of the run since the epoch.",
+                       [("", tool, repr(self.start_time))])
+            add_metric("dicomjson_last_update_time_seconds", "gauge",
+                       "Time of the last converted, skipped or failed file since the epoch.",
+                       [("", tool, repr(self.last_update_time))])
+        return "\n".join(lines) + "\n"
+
+    def write_metrics_file(self, periodic=False):
+        """write_metrics_file
+        Replace the metrics file, under a temporary name first so the
+        collector never reads a partial file
+
+        Keyword Arguments:
+            periodic {bool} -- Skip the write when the previous one is more
+                recent than the interval (default: {False})
+        """
+        if self.metrics_filepath is None:
+            return
+        now = time.monotonic()
+        if periodic and self.last_write is not None and \
+                now - self.last_write < self.metrics_interval:
+            return
+        self.last_write = now
+        temporary_filepath = self.metrics_filepath.with_name(
+            "{}.{}".format(self.metrics_filepath.name, os.getpid()))
+        try:
+            with open(str(temporary_filepath), "w", encoding="utf-8") as metrics_file:
+                metrics_file.write(self.render())
+            os.replace(temporary_filepath, self.metrics_filepath)
+        except BaseException:
+            temporary_filepath.unlink(missing_ok=True)
+            raise
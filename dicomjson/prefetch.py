@@ -0,0 +1,70 @@
+"""prefetch
+Bound the number of items a multiprocessing pool takes from a lazy input
+"""
+
+import threading
+
+# Number of chunks of tasks queued for each worker process
+PREFETCH_CHUNKS_PER_WORKER = 2
+
+
+class BoundedPrefetch:
+    """BoundedPrefetch
+    Wrap an iterable given to Pool.imap. The pool reads its input from a
+    thread as fast as it can, so a generator would be consumed entirely
+    before the first results come back. Each item is taken only once a
+    permit is available, and the consumer gives a permit back for each
+    result it handles
+    """
+
+    def __init__(self, iterable, limit):
+        self.iterable = iterable
+        self.semaphore = threading.Semaphore(limit)
+        self.stopped = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __iter__(self):
+        iterator = iter(self.iterable)
+        while True:
+            self.semaphore.acquire()
+            if self.stopped:
+                return
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            yield item
+
+    def release(self):
+        """release
+        Allow one more item to be taken, once a result has been handled
+        """
+        self.semaphore.release()
+
+    def stop(self):
+        """stop
+        Stop taking items, so the pool thread waiting for a permit ends
+        """
+        self.stopped = True
+        self.semaphore.release()
+
+
+def prefetch_limit(workers, chunksize):
+    """prefetch_limit
+    Compute the number of items taken in advance by a pool. The pool
+    gathers chunksize items before sending them, so the limit must be
+    larger than chunksize to never block
+
+    Arguments:
+        workers {int} -- Number of worker processes
+        chunksize {int} -- Number of items sent at once to a worker
+
+    Returns:
+        int -- Number of items
+    """
+    return workers * chunksize * PREFETCH_CHUNKS_PER_WORKER
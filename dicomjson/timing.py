@@ -0,0 +1,153 @@
+"""timing
+Contains the timing of conversion stages, file by file, and the summary
+of their distribution logged at the end of a run
+"""
+
+from array import array
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+import logging
+import math
+import time
+from constants import JsonConstants
+
+# Percentiles of stage durations given in run summaries
+SUMMARY_PERCENTILES = (50, 95, 99)
+SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+
+logger = logging.getLogger('root')
+
+
+@dataclass
+class FileTimings:
+    """Class for keeping track of the stage durations and sizes of a
+    converted file"""
+    # Duration in seconds, indexed by Stage value
+    durations: dict = field(default_factory=dict)
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+    @contextmanager
+    def measure(self, stage):
+        """measure
+        Add the duration of the block to a stage
+
+        Arguments:
+            stage {Stage} -- Timed stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[stage.value] = self.durations.get(stage.value, 0.0) + \
+                time.perf_counter() - start
+
+    def to_json_dict(self):
+        """to_json_dict
+        Describe the timings as a manifest entry value
+
+        Returns:
+            dict -- Stage durations in seconds, and sizes in bytes
+        """
+        json_dict = {stage: round(duration, 6)
+                     for stage, duration in self.durations.items()}
+        json_dict[JsonConstants.BYTES_IN.value] = self.bytes_in
+        json_dict[JsonConstants.BYTES_OUT.value] = self.bytes_out
+        return json_dict
+
+
+def measure(file_timings, stage):
+    """measure
+    Time a block when timings are collected
+
+    Arguments:
+        file_timings {FileTimings} -- Timings of the converted file, None
+            to not time the block
+        stage {Stage} -- Timed stage
+
+    Returns:
+        contextmanager -- Context timing the block
+    """
+    if file_timings is None:
+        return nullcontext()
+    return file_timings.measure(stage)
+
+
+def percentile(sorted_values, rank):
+    """percentile
+    Find a percentile with the nearest-rank method
+
+    Arguments:
+        sorted_values {list} -- Values sorted in ascending order
+        rank {int} -- Percentile, from 0 to 100
+
+    Returns:
+        float -- Percentile value
+    """
+    return sorted_values[max(0, math.ceil(rank / 100 * len(sorted_values)) - 1)]
+
+
+def format_size(size):
+    """format_size
+    Format a number of bytes for a summary
+
+    Arguments:
+        size {int} -- Number of bytes
+
+    Returns:
+        str -- Size with the largest unit below it
+    """
+    for unit in SIZE_UNITS[:-1]:
+        if size < 1000:
+            return "{:.1f} {}".format(size, unit)
+        size /= 1000
+    return "{:.1f} {}".format(size, SIZE_UNITS[-1])
+
+
+class RunSummary:
+    """RunSummary
+    Collect the timings of each converted file of a run and log the
+    distribution of stage durations once the run is over
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.files = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # Durations indexed by Stage value, in the order stages are first met
+        self.durations = {}
+
+    def add(self, file_timings):
+        """add
+        Add the timings of a converted file
+
+        Arguments:
+            file_timings {FileTimings} -- Timings, None for skipped files
+        """
+        if file_timings is None:
+            return
+        self.files += 1
+        self.bytes_in += file_timings.bytes_in
+        self.bytes_out += file_timings.bytes_out
+        for stage, duration in file_timings.durations.items():
+            self.durations.setdefault(stage, array("d")).append(duration)
+
+    def log(self):
+        """log
+        Log the throughput of the run and the percentiles of each stage
+        """
+        elapsed = time.perf_counter() - self.start
+        logger.info("%d file(s) converted in %.2f s, %.1f files/s, %s read, %s written",
+                    self.files, elapsed, self.files / elapsed if elapsed else 0.0,
+                    format_size(self.bytes_in), format_size(self.bytes_out))
+        if not self.durations:
+            return
+        logger.info("%-14s %s %10s", "stage", " ".join(
+            "{:>10}".format("p{} (ms)".format(rank)) for rank in SUMMARY_PERCENTILES),
+            "total (s)")
+        for stage, durations in self.durations.items():
+            sorted_durations = sorted(durations)
+            logger.info("%-14s %s %10.2f", stage, " ".join(
+                "{:>10.2f}".format(1000 * percentile(sorted_durations, rank))
+                for rank in SUMMARY_PERCENTILES), sum(sorted_durations))
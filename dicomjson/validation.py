@@ -0,0 +1,197 @@
+"""validation
+Check DICOM fields described as JSON against their VR and VM, without
+parsing them with pydicom. A field whose values count does not match the
+VM is still valid, like pydicom accepts it
+"""
+
+import math
+from dicom_dictionary import dictionary_entry
+
+BINARY_VRS = frozenset(("OB", "OD", "OF", "OL", "OV", "OW", "UN"))
+FLOAT_VRS = frozenset(("FD", "FL"))
+INTEGER_VRS = frozenset(("SL", "SS", "SV", "UL", "US", "UV"))
+STRING_VRS = frozenset(("AE", "AS", "CS", "DA", "DT", "LO", "LT", "SH", "ST",
+                        "TM", "UC", "UI", "UR", "UT"))
+PERSON_NAME_KEYS = frozenset(("Alphabetic", "Ideographic", "Phonetic"))
+VALID_VRS = BINARY_VRS | FLOAT_VRS | INTEGER_VRS | STRING_VRS | frozenset(
+    ("AT", "DS", "IS", "PN", "SQ"))
+VALUE_KEYS = ("Value", "InlineBinary", "BulkDataURI")
+
+
+def parse_tag(dicom_json_tag):
+    """parse_tag
+    Convert a JSON tag to an integer
+
+    Arguments:
+        dicom_json_tag {str} -- DICOM tag as 8 hexadecimal characters
+
+    Returns:
+        int -- DICOM tag or None if invalid
+    """
+    if not isinstance(dicom_json_tag, str) or len(dicom_json_tag) != 8:
+        return None
+    try:
+        return int(dicom_json_tag, 16)
+    except ValueError:
+        return None
+
+
+def parse_vm(vm):
+    """parse_vm
+    Convert a dictionary VM (e.g. '1', '1-3', '2-2n') to its bounds
+
+    Arguments:
+        vm {str} -- Dictionary VM
+
+    Returns:
+        tuple -- Minimum, maximum and step of the values count
+    """
+    if "-" not in vm:
+        return int(vm), int(vm), 1
+    minimum, maximum = vm.split("-")
+    if maximum.endswith("n"):
+        step = int(maximum[:-1] or 1)
+        return int(minimum), math.inf, step
+    return int(minimum), int(maximum), 1
+
+
+def is_number(value, number_type):
+    """is_number
+    Check if a JSON value can be converted to a number
+
+    Arguments:
+        value {object} -- JSON value
+        number_type {type} -- int or float
+
+    Returns:
+        bool -- True if value is a number or a string holding a number
+    """
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return number_type is float or isinstance(value, int)
+    if not isinstance(value, str):
+        return False
+    if not value.strip():
+        return True
+    try:
+        number_type(value)
+    except ValueError:
+        return False
+    return True
+
+
+def is_valid_value(vr, value):
+    """is_valid_value
+    Check if one item of a JSON 'Value' array is standard with the VR
+
+    Arguments:
+        vr {str} -- Field VR
+        value {object} -- JSON value
+
+    Returns:
+        bool -- True if valid
+    """
+    if vr == "SQ":
+        return value is None or is_valid_dataset(value)
+    if value is None:
+        return True
+    if vr in STRING_VRS or vr == "AT":
+        return isinstance(value, str)
+    if vr == "PN":
+        if isinstance(value, str):
+            return True
+        return (isinstance(value, dict)
+                and PERSON_NAME_KEYS.issuperset(value)
+                and all(isinstance(name, str) for name in value.values()))
+    if vr in INTEGER_VRS:
+        return isinstance(value, int) and not isinstance(value, bool)
+    if vr in FLOAT_VRS:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if vr == "IS":
+        return is_number(value, int)
+    if vr == "DS":
+        return is_number(value, float)
+    return True
+
+
+def is_valid_field(dicom_json_tag, dicom_json_value):
+    """is_valid_field
+    Check a DICOM field described as JSON against the VR available in the
+    DICOM data dictionary. The values count is checked by vm_mismatch
+
+    Arguments:
+        dicom_json_tag {str} -- DICOM tag as 8 hexadecimal characters
+        dicom_json_value {dict} -- DICOM JSON Model attribute
+
+    Returns:
+        bool -- True if the field can be added to a dataset
+    """
+    tag = parse_tag(dicom_json_tag)
+    if tag is None or not isinstance(dicom_json_value, dict):
+        return False
+    vr = dicom_json_value.get("vr")
+    if vr not in VALID_VRS:
+        return False
+
+    entry = dictionary_entry(tag)
+    if entry and vr != "UN" and vr not in entry[0].split(" or "):
+        return False
+
+    value_keys = [key for key in VALUE_KEYS if key in dicom_json_value]
+    if not value_keys:
+        return True
+    if len(value_keys) > 1:
+        return False
+    value_key = value_keys[0]
+    value = dicom_json_value[value_key]
+
+    if value_key != "Value":
+        if isinstance(value, list):
+            value = value[0] if value else None
+        return vr in BINARY_VRS and isinstance(value, str)
+
+    if not isinstance(value, list):
+        return False
+    return all(is_valid_value(vr, item) for item in value)
+
+
+def vm_mismatch(dicom_json_tag, dicom_json_value):
+    """vm_mismatch
+    Check the values count of a valid DICOM field described as JSON against
+    the VM available in the DICOM data dictionary. Vendor data often holds
+    a single value where several are expected, like ImageType
+
+    Arguments:
+        dicom_json_tag {str} -- DICOM tag as 8 hexadecimal characters
+        dicom_json_value {dict} -- DICOM JSON Model attribute
+
+    Returns:
+        str -- Dictionary VM, None if the values count matches it
+    """
+    entry = dictionary_entry(parse_tag(dicom_json_tag))
+    value = dicom_json_value.get("Value")
+    vr = dicom_json_value.get("vr")
+    # A sequence is always a single value
+    if not entry or not isinstance(value, list) or not value or \
+            vr == "SQ" or vr in BINARY_VRS:
+        return None
+    minimum, maximum, step = parse_vm(entry[1])
+    if not minimum <= len(value) <= maximum or len(value) % step:
+        return entry[1]
+    return None
+
+
+def is_valid_dataset(dicom_json_dataset):
+    """is_valid_dataset
+    Check every DICOM field of a dataset described as JSON
+
+    Arguments:
+        dicom_json_dataset {dict} -- DICOM JSON Model dataset
+
+    Returns:
+        bool -- True if every field is valid
+    """
+    return isinstance(dicom_json_dataset, dict) and all(
+        is_valid_field(dicom_json_tag, dicom_json_value)
+        for dicom_json_tag, dicom_json_value in dicom_json_dataset.items())